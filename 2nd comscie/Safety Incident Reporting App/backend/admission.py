@@ -0,0 +1,314 @@
+"""
+Admission control and per-client rate limiting.
+
+Requests pass two checks before reaching a route:
+
+1. Token-bucket rate limits per user (JWT subject) and per client IP, with a
+   separate, much tighter per-IP bucket for the bcrypt-heavy auth routes.
+2. A priority gate that caps the number of requests in flight. When it is
+   full, requests wait in a priority queue (incident/panic creation first,
+   lists and analytics last). A class whose queue is already at its depth
+   limit, or a request that waits longer than the queue timeout, is shed
+   immediately with 503 instead of piling up.
+
+Buckets and the gate are per process, so with serve.py's pre-forked workers
+every limit applies per worker.
+
+Safety-critical requests only get their class with a valid bearer token
+(anonymous ones are treated as normal requests). They skip the regular
+buckets for a much more generous per-IP one, and may use a reserve of
+in-flight slots the other classes can't take.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from auth import decode_access_token
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Priority classes, lower value is served first
+CRITICAL = 0
+AUTH = 1
+NORMAL = 2
+LOW = 3
+
+CLASS_NAMES = {CRITICAL: "critical", AUTH: "auth", NORMAL: "normal", LOW: "low"}
+
+# (method, path prefix, class); first match wins, None matches any method
+ROUTE_CLASSES = [
+    # Offline backlog sync: up to BATCH_MAX_INCIDENTS per request, not urgent
+    ("POST", "/incidents/batch", NORMAL),
+    ("POST", "/incidents", CRITICAL),
+    (None, "/panic", CRITICAL),
+    ("POST", "/auth/login", AUTH),
+    ("POST", "/auth/register", AUTH),
+    # Responders working the queue, never shed ahead of feeds and analytics
+    (None, "/triage", NORMAL),
+    ("GET", "/incidents", LOW),
+    ("GET", "/community", LOW),
+    (None, "/analytics", LOW),
+]
+
+# Bound on tracked clients per bucket table, oldest idle entries are evicted
+MAX_TRACKED_CLIENTS = 100_000
+
+def classify(method: str, path: str) -> int:
+    """Priority class for a request"""
+    for rule_method, prefix, priority in ROUTE_CLASSES:
+        if (rule_method is None or rule_method == method) and path.startswith(prefix):
+            return priority
+    return NORMAL
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until one is available)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+
+        return False, (1 - self.tokens) / self.rate
+
+class RateLimiter:
+    """Token buckets keyed by client, with LRU eviction"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, key: str) -> Tuple[bool, float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        return bucket.take(time.monotonic())
+
+class PriorityGate:
+    """Caps in-flight requests and hands free slots out by priority"""
+
+    def __init__(self, max_in_flight: int, critical_reserve: int, max_queue: Dict[int, int]):
+        self.max_in_flight = max_in_flight
+        self.critical_reserve = critical_reserve
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued: Dict[int, int] = defaultdict(int)
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _limit(self, priority: int) -> int:
+        if priority == CRITICAL:
+            return self.max_in_flight + self.critical_reserve
+        return self.max_in_flight
+
+    def _has_waiters_before(self, priority: int) -> bool:
+        return any(self.queued[p] for p in CLASS_NAMES if p <= priority)
+
+    async def acquire(self, priority: int, timeout: float) -> Optional[str]:
+        """Wait for a slot; returns None when admitted or the reason it was shed"""
+        if self.in_flight < self._limit(priority) and not self._has_waiters_before(priority):
+            self.in_flight += 1
+            return None
+
+        if self.queued[priority] >= self.max_queue[priority]:
+            return "queue_full"
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.queued[priority] += 1
+
+        granted = False
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            granted = True
+            return None
+
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+
+        finally:
+            if not granted:
+                if future.done():
+                    # Handed a slot just as we gave up (timeout or disconnect), pass it on
+                    self.release()
+                else:
+                    future.cancel()
+                    self.queued[priority] -= 1
+
+    def release(self):
+        """Free a slot, giving it straight to the best waiting request"""
+        self.in_flight -= 1
+
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self._limit(priority):
+                return
+            heapq.heappop(self._waiters)
+            self.queued[priority] -= 1
+            self.in_flight += 1
+            future.set_result(True)
+            return
+
+class AdmissionMetrics:
+    """Counters for admission decisions, exposed at /metrics/admission"""
+
+    def __init__(self):
+        self.decisions: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, priority: int, decision: str):
+        self.decisions[CLASS_NAMES[priority]][decision] += 1
+
+    def snapshot(self, gate: PriorityGate) -> Dict:
+        return {
+            "in_flight": gate.in_flight,
+            "queued": {CLASS_NAMES[p]: gate.queued[p] for p in CLASS_NAMES},
+            "decisions": {name: dict(counts) for name, counts in self.decisions.items()},
+        }
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits and the priority gate"""
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = settings.admission_enabled
+        self.user_limiter = RateLimiter(settings.rate_limit_user_per_second, settings.rate_limit_user_burst)
+        self.ip_limiter = RateLimiter(settings.rate_limit_ip_per_second, settings.rate_limit_ip_burst)
+        self.login_limiter = RateLimiter(settings.rate_limit_login_per_minute / 60, settings.rate_limit_login_burst)
+        self.critical_limiter = RateLimiter(settings.rate_limit_critical_ip_per_second, settings.rate_limit_critical_ip_burst)
+        self.gate = PriorityGate(
+            settings.admission_max_in_flight,
+            settings.admission_critical_reserve,
+            {
+                CRITICAL: settings.admission_max_queue_critical,
+                AUTH: settings.admission_max_queue_auth,
+                NORMAL: settings.admission_max_queue_normal,
+                LOW: settings.admission_max_queue_low,
+            },
+        )
+        self.metrics = admission_metrics
+        admission_state["gate"] = self.gate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        priority = classify(scope["method"], scope["path"])
+        username = token_subject(scope)
+
+        # Otherwise anyone could skip the rate limits by posting junk to /incidents
+        if priority == CRITICAL and not username:
+            priority = NORMAL
+
+        limited = self._check_limits(scope, priority, username)
+        if limited:
+            self.metrics.record(priority, "rate_limited")
+            response = JSONResponse(
+                {"detail": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, round(limited)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        shed = await self.gate.acquire(priority, settings.admission_queue_timeout_seconds)
+        if shed:
+            self.metrics.record(priority, f"shed_{shed}")
+            response = JSONResponse(
+                {"detail": "Server is overloaded, please retry"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.metrics.record(priority, "admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gate.release()
+
+    def _check_limits(self, scope, priority: int, username: Optional[str]) -> float:
+        """Seconds to wait if a rate limit is exceeded, else 0"""
+        ip = client_ip(scope)
+
+        if priority == CRITICAL:
+            allowed, retry_after = self.critical_limiter.check(ip)
+            return 0 if allowed else retry_after
+
+        if priority == AUTH:
+            allowed, retry_after = self.login_limiter.check(ip)
+            if not allowed:
+                return retry_after
+
+        allowed, retry_after = self.ip_limiter.check(ip)
+        if not allowed:
+            return retry_after
+
+        if username:
+            allowed, retry_after = self.user_limiter.check(username)
+            if not allowed:
+                return retry_after
+
+        return 0
+
+def client_ip(scope) -> str:
+    """Client address, optionally taken from X-Forwarded-For behind a proxy"""
+    if settings.trust_forwarded_for:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def token_subject(scope) -> Optional[str]:
+    """Username from a bearer token, without touching the database"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                token_data = decode_access_token(token)
+                return token_data.username if token_data else None
+    return None
+
+admission_metrics = AdmissionMetrics()
+admission_state: Dict[str, PriorityGate] = {}
+
+def get_admission_metrics() -> Dict:
+    """Current admission metrics for this process"""
+    gate = admission_state.get("gate")
+    if gate is None:
+        return {"in_flight": 0, "queued": {}, "decisions": {}}
+    return admission_metrics.snapshot(gate)
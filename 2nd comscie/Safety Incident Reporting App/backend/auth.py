@@ -1,12 +1,9 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 from config import get_settings
 from pydantic import BaseModel
 
-settings = get_settings()
-
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -28,6 +25,9 @@ def get_password_hash(password: str) -> str:
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
+    from jose import jwt  # deferred: python-jose is slow to import
+    
+    settings = get_settings()
     to_encode = data.copy()
     
     if expires_delta:
@@ -42,6 +42,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def decode_access_token(token: str) -> Optional[TokenData]:
     """Decode and verify JWT token"""
+    from jose import JWTError, jwt
+    
+    settings = get_settings()
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         username: str = payload.get("sub")
@@ -0,0 +1,100 @@
+"""
+Benchmark: duplicate-cluster assignment latency as the incidents table grows
+
+Inserts synthetic incidents (most around a set of hotspots, the rest spread
+over a city-sized box, across 30 days) through the same INSERT +
+clustering.assign_cluster path the API uses, and reports assignment
+latency per growth step. Flat latency across steps means assignment is
+independent of table size.
+
+Requires a reachable MySQL configured through .env. Creates its own user
+and removes its incidents and clusters afterwards.
+
+    python bench_clustering.py --steps 1000 5000 20000 50000
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from database import get_db_connection, init_database
+from clustering import assign_cluster
+
+CITY = (-26.30, -26.00, 27.85, 28.20)  # lat_min, lat_max, lng_min, lng_max
+START = datetime(2026, 1, 1)
+
+def random_incident(hotspots):
+    if random.random() < 0.7:
+        lat, lng = random.choice(hotspots)
+        distance, angle = random.uniform(0, 150), random.uniform(0, 2 * math.pi)
+        lat += distance * math.cos(angle) / 111_320
+        lng += distance * math.sin(angle) / (111_320 * math.cos(math.radians(lat)))
+    else:
+        lat, lng = random.uniform(CITY[0], CITY[1]), random.uniform(CITY[2], CITY[3])
+    return lat, lng, START + timedelta(minutes=random.uniform(0, 30 * 24 * 60))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--hotspots", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    hotspots = [(random.uniform(CITY[0], CITY[1]), random.uniform(CITY[2], CITY[3])) for _ in range(args.hotspots)]
+
+    init_database()
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+
+    suffix = str(time.time_ns())
+    cursor.execute("""
+        INSERT INTO users (email, username, full_name, hashed_password)
+        VALUES (%s, %s, %s, %s)
+    """, (f"bench{suffix}@example.com", f"bench{suffix}", "Benchmark", "x"))
+    user_id = cursor.lastrowid
+    connection.commit()
+
+    inserted = 0
+    cluster_ids = set()
+    print(f"{'rows':>8} {'p50 ms':>9} {'p99 ms':>9} {'clusters':>9}")
+
+    try:
+        for target in args.steps:
+            latencies = []
+            while inserted < target:
+                lat, lng, when = random_incident(hotspots)
+                cursor.execute("""
+                    INSERT INTO incidents
+                    (user_id, title, description_encrypted, incident_type, severity,
+                     location_lat, location_lng, incident_date)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """, (user_id, "benchmark", "", "other", "low", lat, lng, when))
+
+                start = time.perf_counter()
+                cluster_id, _ = assign_cluster(cursor, cursor.lastrowid, lat, lng, when)
+                latencies.append(time.perf_counter() - start)
+
+                connection.commit()
+                cluster_ids.add(cluster_id)
+                inserted += 1
+
+            latencies.sort()
+            p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) >= 100 else latencies[-1]
+            print(f"{inserted:>8} {statistics.median(latencies) * 1000:>9.3f} {p99 * 1000:>9.3f} {len(cluster_ids):>9}")
+
+    finally:
+        cursor.execute("DELETE FROM incidents WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        ids = sorted(cluster_ids)
+        for i in range(0, len(ids), 1000):
+            chunk = ids[i:i + 1000]
+            cursor.execute(f"DELETE FROM incident_clusters WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+if __name__ == "__main__":
+    main()
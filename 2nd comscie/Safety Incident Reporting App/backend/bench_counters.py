@@ -0,0 +1,149 @@
+"""
+Contention benchmark: per-event UPDATEs vs write-behind counters
+
+Many threads like the same post at once. The per-event mode runs one
+UPDATE + COMMIT per like (every thread queues on the same row lock); the
+write-behind mode records likes in counters.CounterBuffer and flushes them in
+batches; its likes/s includes the final flush, until every like is committed.
+
+Requires a reachable MySQL configured through .env. Creates its own user and
+post and removes them afterwards.
+
+    python bench_counters.py --threads 32 --events 200
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+
+from database import get_db_connection, init_database
+from counters import CounterBuffer
+
+def create_post() -> tuple:
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        suffix = str(time.time_ns())
+        cursor.execute("""
+            INSERT INTO users (email, username, full_name, hashed_password)
+            VALUES (%s, %s, %s, %s)
+        """, (f"bench{suffix}@example.com", f"bench{suffix}", "Benchmark", "x"))
+        user_id = cursor.lastrowid
+        cursor.execute("""
+            INSERT INTO community_posts (user_id, title, content_encrypted)
+            VALUES (%s, %s, %s)
+        """, (user_id, "benchmark", ""))
+        post_id = cursor.lastrowid
+        connection.commit()
+        return user_id, post_id
+    finally:
+        cursor.close()
+        connection.close()
+
+def read_likes(post_id: int) -> int:
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT likes_count FROM community_posts WHERE id = %s", (post_id,))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        connection.close()
+
+def cleanup(user_id: int):
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+def run_threads(threads: int, worker) -> tuple:
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def run():
+        local = worker()
+        with latencies_lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+def per_event(post_id: int, events: int):
+    def worker():
+        latencies = []
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        try:
+            for _ in range(events):
+                start = time.perf_counter()
+                cursor.execute("""
+                    UPDATE community_posts SET likes_count = likes_count + 1
+                    WHERE id = %s
+                """, (post_id,))
+                connection.commit()
+                latencies.append(time.perf_counter() - start)
+        finally:
+            cursor.close()
+            connection.close()
+        return latencies
+    return worker
+
+def write_behind(buffer: CounterBuffer, post_id: int, events: int):
+    def worker():
+        latencies = []
+        for _ in range(events):
+            start = time.perf_counter()
+            buffer.increment(post_id, "likes_count", 1)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    return worker
+
+def report(name: str, total_events: int, elapsed: float, latencies: list):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<14} {total_events / elapsed:>10.0f} likes/s   "
+          f"p50 {statistics.median(latencies) * 1000:>7.3f} ms   p99 {p99 * 1000:>7.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--events", type=int, default=200, help="likes per thread")
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    init_database()
+    total = args.threads * args.events
+    user_id, post_id = create_post()
+
+    try:
+        elapsed, latencies = run_threads(args.threads, per_event(post_id, args.events))
+        report("per-event", total, elapsed, latencies)
+        assert read_likes(post_id) == total
+
+        with tempfile.TemporaryDirectory() as journal_dir:
+            buffer = CounterBuffer(journal_dir, args.flush_interval)
+            buffer.start()
+            elapsed, latencies = run_threads(args.threads, write_behind(buffer, post_id, args.events))
+            # Not done until the last batch has committed
+            start = time.perf_counter()
+            buffer.stop()
+            final_flush = time.perf_counter() - start
+        report("write-behind", total, elapsed + final_flush, latencies)
+        print(f"{'':<14} {buffer.flushes} flushes, final flush {final_flush * 1000:.1f} ms")
+        assert read_likes(post_id) == 2 * total
+
+    finally:
+        cleanup(user_id)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Throughput benchmark: single uvicorn process vs pre-forked workers
+
+Starts `python main.py` and then `python serve.py` on a spare port, drives
+each with the same number of concurrent keep-alive clients for a fixed
+duration and prints requests/s and latency percentiles.
+
+Rate limiting is switched off for the server processes so the numbers
+reflect serving capacity. The app still needs its database at startup.
+
+    python bench_server.py --clients 64 --duration 10
+    python bench_server.py --login testuser:securepass123   # bcrypt-bound
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from serve import default_workers
+
+def wait_until_up(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up")
+
+def drive(port: int, clients: int, duration: float, method: str, path: str, body: bytes, headers: dict) -> tuple:
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        local = []
+        failed = 0
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, errors[0]
+
+def bench(name: str, command: list, port: int, args, method: str, path: str, body: bytes, headers: dict):
+    env = dict(os.environ, PORT=str(port), HOST="127.0.0.1", ADMISSION_ENABLED="false")
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port)
+        # Warm-up so every worker has its connections and caches ready
+        drive(port, args.clients, 1, method, path, body, headers)
+        elapsed, latencies, errors = drive(port, args.clients, args.duration, method, path, body, headers)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    median = statistics.median(latencies) if latencies else 0
+    print(f"{name:<22} {len(latencies) / elapsed:>9.0f} req/s   "
+          f"p50 {median * 1000:>7.2f} ms   p99 {p99 * 1000:>7.2f} ms   errors {errors}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--login", metavar="USER:PASSWORD", help="benchmark POST /auth/login instead of GET /")
+    args = parser.parse_args()
+
+    if args.login:
+        username, _, password = args.login.partition(":")
+        method, path = "POST", "/auth/login"
+        body = urlencode({"username": username, "password": password}).encode()
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    else:
+        method, path, body, headers = "GET", "/", None, {}
+
+    print(f"{method} {path}, {args.clients} clients, {args.duration:.0f}s")
+    bench("single process", [sys.executable, "main.py"], args.port, args, method, path, body, headers)
+    bench(f"serve.py ({args.workers} workers)",
+          [sys.executable, "serve.py", "--workers", str(args.workers), "--port", str(args.port)],
+          args.port, args, method, path, body, headers)
+
+if __name__ == "__main__":
+    main()
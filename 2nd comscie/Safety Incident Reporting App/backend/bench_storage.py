@@ -0,0 +1,196 @@
+"""
+Benchmark: MySQL vs embedded SQLite storage on the core workloads
+
+Runs the same repository calls the routes make against each backend:
+
+- auth:      register (create_user, hash precomputed so bcrypt doesn't
+             dominate), login lookup on the primary, token lookup on the
+             read path
+- incidents: create one per transaction, create in batches (the write
+             pipeline's group commit), list a user's incidents, get one by
+             id, walk the triage queue
+- mixed:     --threads readers doing get-by-id while one writer creates
+             incidents, to show reads running alongside writes
+
+and prints ops/s and latency percentiles per workload and backend.
+
+SQLite runs on a fresh file in a temporary directory (or --sqlite-path).
+MySQL needs a reachable server configured through .env; the benchmark
+creates its own users and removes them, their incidents and clusters
+afterwards.
+
+    python bench_storage.py                       # sqlite only
+    python bench_storage.py --backends sqlite mysql --incidents 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from auth import get_password_hash
+from repository import Repository
+from storage import MySQLStorage
+from sqlite_storage import SQLiteStorage
+
+class Incident:
+    def __init__(self, i: int):
+        self.title = f"benchmark {i}"
+        self.description = "Benchmark incident description " * 4
+        self.incident_type = random.choice(["theft", "assault", "vandalism", "other"])
+        self.severity = random.choice(["low", "medium", "high", "critical"])
+        self.location_lat = -26.2 + random.uniform(-0.1, 0.1)
+        self.location_lng = 28.0 + random.uniform(-0.1, 0.1)
+        self.location_address = "1 Benchmark Street"
+        self.incident_date = datetime(2026, 1, 1) + timedelta(minutes=random.uniform(0, 60 * 24 * 30))
+
+def timed(operations, run) -> list:
+    latencies = []
+    for operation in operations:
+        start = time.perf_counter()
+        run(operation)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def report(backend: str, workload: str, latencies: list, elapsed: float = None, ops: int = None):
+    latencies = sorted(latencies)
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+    ops = ops if ops is not None else len(latencies)
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"{backend:<7} {workload:<22} {ops / elapsed:>9.0f} ops/s   "
+          f"p50 {statistics.median(latencies) * 1000:>8.3f} ms   p99 {p99 * 1000:>8.3f} ms")
+
+def run_backend(name: str, repository: Repository, args, hashed_password: str, created_users: list):
+    suffix = str(time.time_ns())
+
+    # Auth
+    usernames = [f"bench{suffix}_{i}" for i in range(args.users)]
+    latencies = timed(usernames, lambda username: created_users.append(
+        repository.create_user(f"{username}@example.com", username, "Benchmark", hashed_password)["id"]
+    ))
+    report(name, "register", latencies)
+
+    lookups = [random.choice(usernames) for _ in range(args.lookups)]
+    report(name, "login lookup", timed(lookups, lambda username: repository.get_user_by_username(username, primary=True)))
+    report(name, "token lookup", timed(lookups, lambda username: repository.get_user_by_username(username, pin_key=username)))
+
+    # Incidents
+    user_ids = created_users[-len(usernames):]
+    connection = repository.connect()
+    try:
+        latencies = timed(range(args.incidents), lambda i: repository.create_incidents(
+            connection, [(random.choice(user_ids), Incident(i))]
+        ))
+        report(name, "create (1 per commit)", latencies)
+
+        batches = [[(random.choice(user_ids), Incident(i)) for i in range(args.batch)]
+                   for _ in range(max(args.incidents // args.batch, 1))]
+        latencies = timed(batches, lambda batch: repository.create_incidents(connection, batch))
+        report(name, f"create ({args.batch} per commit)", latencies, ops=len(batches) * args.batch)
+    finally:
+        connection.close()
+
+    incidents = []
+    for user_id in user_ids:
+        incidents.extend((row["id"], user_id) for row in repository.list_incidents(user_id))
+
+    report(name, "list own incidents", timed(
+        [random.choice(user_ids) for _ in range(args.lookups)],
+        lambda user_id: repository.list_incidents(user_id)
+    ))
+
+    gets = [random.choice(incidents) for _ in range(args.lookups)]
+    report(name, "get incident", timed(gets, lambda pair: repository.get_incident(*pair)))
+
+    def walk_triage(_):
+        after = None
+        while True:
+            _, after = repository.triage_page("reported", after=after, limit=50)
+            if after is None:
+                break
+
+    report(name, "triage walk (50/page)", timed(range(max(args.lookups // 100, 1)), walk_triage))
+
+    # Reads alongside a writer
+    stop = threading.Event()
+
+    def writer():
+        connection = repository.connect()
+        i = 0
+        try:
+            while not stop.is_set():
+                repository.create_incidents(connection, [(random.choice(user_ids), Incident(i))])
+                i += 1
+        finally:
+            connection.close()
+
+    def reader(pairs):
+        return timed(pairs, lambda pair: repository.get_incident(*pair))
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    chunks = [gets[i::args.threads] for i in range(args.threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        latencies = [latency for chunk in executor.map(reader, chunks) for latency in chunk]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    writer_thread.join()
+    report(name, f"get + writer ({args.threads} thr)", latencies, elapsed=elapsed)
+
+def cleanup_mysql(repository: Repository, user_ids: list):
+    if not user_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    connection = repository.connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            DELETE c FROM incident_clusters c
+            JOIN incidents i ON i.cluster_id = c.id
+            WHERE i.user_id IN ({placeholders})
+        """, user_ids)
+        cursor.execute(f"DELETE FROM incidents WHERE user_id IN ({placeholders})", user_ids)
+        cursor.execute(f"DELETE FROM users WHERE id IN ({placeholders})", user_ids)
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=["sqlite", "mysql"], default=["sqlite"])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--incidents", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--sqlite-path", help="default: a fresh file in a temporary directory")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    hashed_password = get_password_hash("benchmark-password")
+
+    for name in args.backends:
+        created_users = []
+        if name == "sqlite":
+            with tempfile.TemporaryDirectory() as tmp:
+                repository = Repository(SQLiteStorage(args.sqlite_path or os.path.join(tmp, "bench.db")))
+                repository.init_schema()
+                run_backend(name, repository, args, hashed_password, created_users)
+        else:
+            repository = Repository(MySQLStorage())
+            repository.init_schema()
+            try:
+                run_backend(name, repository, args, hashed_password, created_users)
+            finally:
+                cleanup_mysql(repository, created_users)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: per-request incident inserts vs the group-commit pipeline
+
+Runs the same concurrent surge of incident submissions twice:
+
+- per-request: the previous create_incident flow, i.e. INSERT, cluster,
+  COMMIT, SELECT the row back and decrypt it, on its own connection per
+  incident
+- pipeline: write_pipeline.WritePipeline, batching concurrent inserts into
+  one transaction and building responses from the plaintext
+
+and prints incidents/s, latency percentiles, commits and batch sizes.
+
+Requires a reachable MySQL configured through .env. Creates its own user
+and removes its incidents and their clusters afterwards.
+
+    python bench_write_pipeline.py --clients 64 --incidents 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from clustering import assign_cluster
+from database import get_db_connection, init_database
+from encryption import encrypt_data, decrypt_data
+from write_pipeline import WritePipeline
+
+class Incident:
+    def __init__(self, i: int):
+        self.title = f"benchmark {i}"
+        self.description = "Benchmark incident description " * 4
+        self.incident_type = "other"
+        self.severity = random.choice(["low", "medium", "high"])
+        self.location_lat = -26.2 + random.uniform(-0.1, 0.1)
+        self.location_lng = 28.0 + random.uniform(-0.1, 0.1)
+        self.location_address = "1 Benchmark Street"
+        self.incident_date = datetime(2026, 1, 1) + timedelta(minutes=random.uniform(0, 60 * 24 * 30))
+
+def create_per_request(user_id: int, incident: Incident):
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            INSERT INTO incidents
+            (user_id, title, description_encrypted, incident_type, severity,
+             location_lat, location_lng, location_address_encrypted, incident_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (user_id, incident.title, encrypt_data(incident.description), incident.incident_type,
+              incident.severity, incident.location_lat, incident.location_lng,
+              encrypt_data(incident.location_address), incident.incident_date))
+        incident_id = cursor.lastrowid
+        assign_cluster(cursor, incident_id, incident.location_lat, incident.location_lng, incident.incident_date)
+        connection.commit()
+        cursor.execute("SELECT * FROM incidents WHERE id = %s", (incident_id,))
+        row = cursor.fetchone()
+        row["description"] = decrypt_data(row["description_encrypted"])
+        row["location_address"] = decrypt_data(row["location_address_encrypted"])
+        return row
+    finally:
+        cursor.close()
+        connection.close()
+
+async def surge(clients: int, per_client: int, submit) -> tuple:
+    latencies = []
+
+    async def client(c: int):
+        for i in range(per_client):
+            start = time.perf_counter()
+            await submit(Incident(c * per_client + i))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(c) for c in range(clients)])
+    return time.perf_counter() - start, latencies
+
+def report(name: str, elapsed: float, latencies: list, commits: int):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} {len(latencies) / elapsed:>8.0f} incidents/s   "
+          f"p50 {statistics.median(latencies) * 1000:>7.2f} ms   p99 {p99 * 1000:>7.2f} ms   "
+          f"{commits} commits ({commits / elapsed:.0f}/s)")
+
+async def run(args, user_id: int):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.clients))
+
+    async def per_request(incident):
+        return await loop.run_in_executor(None, create_per_request, user_id, incident)
+
+    elapsed, latencies = await surge(args.clients, args.incidents, per_request)
+    report("per-request", elapsed, latencies, len(latencies))
+
+    pipeline = WritePipeline(args.max_batch, args.max_delay_ms, args.writers)
+    await pipeline.start()
+
+    async def grouped(incident):
+        return await pipeline.submit(user_id, incident)
+
+    elapsed, latencies = await surge(args.clients, args.incidents, grouped)
+    await pipeline.stop()
+    metrics = pipeline.metrics()
+    report("pipeline", elapsed, latencies, metrics["commits_total"])
+    print(f"{'':<12} batch sizes: {metrics['batch_size_histogram']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--incidents", type=int, default=20, help="incidents per client")
+    parser.add_argument("--max-batch", type=int, default=50)
+    parser.add_argument("--max-delay-ms", type=float, default=0)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    init_database()
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    suffix = str(time.time_ns())
+    cursor.execute("""
+        INSERT INTO users (email, username, full_name, hashed_password)
+        VALUES (%s, %s, %s, %s)
+    """, (f"bench{suffix}@example.com", f"bench{suffix}", "Benchmark", "x"))
+    user_id = cursor.lastrowid
+    connection.commit()
+
+    try:
+        asyncio.run(run(args, user_id))
+    finally:
+        cursor.execute("""
+            DELETE c FROM incident_clusters c
+            JOIN incidents i ON i.cluster_id = c.id
+            WHERE i.user_id = %s
+        """, (user_id,))
+        cursor.execute("DELETE FROM incidents WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+if __name__ == "__main__":
+    main()
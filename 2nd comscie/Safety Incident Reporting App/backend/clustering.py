@@ -0,0 +1,151 @@
+"""
+Incremental spatio-temporal clustering of duplicate incident reports.
+
+Each new incident with coordinates is assigned to an event cluster inside
+the transaction that inserts it. Space is cut into cells at least
+cluster_radius_meters wide and time into buckets cluster_window_minutes
+long; incident_cluster_cells records which clusters have a member (or their
+centre) in which (cell, bucket). Finding candidate clusters is a primary-key lookup of the
+3 x 3 x 3 neighbourhood around the new incident, so the cost of an
+assignment does not grow with the size of the incidents table.
+
+A candidate matches when the incident is within the radius of the cluster
+centre and within the time window of the cluster's first/last report. The
+closest match wins; otherwise the incident starts a new cluster.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_settings
+
+settings = get_settings()
+
+EARTH_RADIUS_METERS = 6_371_000
+METERS_PER_DEGREE_LAT = 111_320
+
+EPOCH = datetime(1970, 1, 1)
+
+CellKey = Tuple[int, int, int]
+
+def haversine_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+def _naive_utc(when: datetime) -> datetime:
+    if when.tzinfo is not None:
+        return when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+def _lat_cell_size() -> float:
+    return settings.cluster_radius_meters / METERS_PER_DEGREE_LAT
+
+def _lng_cell_size(cell_lat: int) -> float:
+    # Longitude degrees shrink towards the poles; size each row so cells stay
+    # at least one radius wide even at that row's poleward edge
+    lat_size = _lat_cell_size()
+    edge_lat = min(max(abs(cell_lat * lat_size), abs((cell_lat + 1) * lat_size)), 89.0)
+    return lat_size / max(math.cos(math.radians(edge_lat)), 0.01)
+
+def time_bucket(when: datetime) -> int:
+    seconds = (_naive_utc(when) - EPOCH).total_seconds()
+    return int(seconds // (settings.cluster_window_minutes * 60))
+
+def cell_key(lat: float, lng: float, when: datetime) -> CellKey:
+    """Grid cell and time bucket an incident falls in"""
+    cell_lat = math.floor(lat / _lat_cell_size())
+    cell_lng = math.floor(lng / _lng_cell_size(cell_lat))
+    return cell_lat, cell_lng, time_bucket(when)
+
+def neighbourhood(lat: float, lng: float, when: datetime) -> List[CellKey]:
+    """The 27 (cell, bucket) keys that can hold a cluster within range"""
+    cell_lat = math.floor(lat / _lat_cell_size())
+    bucket = time_bucket(when)
+
+    keys = []
+    for row in (cell_lat - 1, cell_lat, cell_lat + 1):
+        # Each row has its own longitude cell size
+        cell_lng = math.floor(lng / _lng_cell_size(row))
+        for column in (cell_lng - 1, cell_lng, cell_lng + 1):
+            for b in (bucket - 1, bucket, bucket + 1):
+                keys.append((row, column, b))
+    return keys
+
+def find_cluster(db_cursor, lat: float, lng: float, when: datetime) -> Optional[Dict[str, Any]]:
+    """Closest existing cluster the incident belongs to, locked for update"""
+    keys = neighbourhood(lat, lng, when)
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(keys))
+
+    db_cursor.execute(f"""
+        SELECT DISTINCT c.*
+        FROM incident_cluster_cells k
+        JOIN incident_clusters c ON c.id = k.cluster_id
+        WHERE (k.cell_lat, k.cell_lng, k.time_bucket) IN ({placeholders})
+        FOR UPDATE
+    """, [value for key in keys for value in key])
+
+    window_seconds = settings.cluster_window_minutes * 60
+    when = _naive_utc(when)
+
+    best, best_distance = None, None
+    for cluster in db_cursor.fetchall():
+        if (cluster['first_incident_date'] - when).total_seconds() > window_seconds:
+            continue
+        if (when - cluster['last_incident_date']).total_seconds() > window_seconds:
+            continue
+        distance = haversine_meters(lat, lng, float(cluster['center_lat']), float(cluster['center_lng']))
+        if distance <= settings.cluster_radius_meters and (best is None or distance < best_distance):
+            best, best_distance = cluster, distance
+
+    return best
+
+def assign_cluster(db_cursor, incident_id: int, lat: Optional[float], lng: Optional[float],
+                   when: datetime) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Put a freshly inserted incident into a cluster in the caller's
+    transaction. Returns (cluster_id, cluster_size), or (None, None) for
+    incidents without coordinates. Expects a dictionary cursor.
+    """
+    if lat is None or lng is None:
+        return None, None
+
+    lat, lng = float(lat), float(lng)
+    when = _naive_utc(when)
+    cluster = find_cluster(db_cursor, lat, lng, when)
+
+    if cluster is None:
+        center_lat, center_lng = lat, lng
+        db_cursor.execute("""
+            INSERT INTO incident_clusters
+            (center_lat, center_lng, first_incident_date, last_incident_date, size)
+            VALUES (%s, %s, %s, %s, 1)
+        """, (lat, lng, when, when))
+        cluster_id, size = db_cursor.lastrowid, 1
+    else:
+        cluster_id, size = cluster['id'], cluster['size'] + 1
+        # Running mean of member coordinates
+        center_lat = float(cluster['center_lat']) + (lat - float(cluster['center_lat'])) / size
+        center_lng = float(cluster['center_lng']) + (lng - float(cluster['center_lng'])) / size
+        db_cursor.execute("""
+            UPDATE incident_clusters
+            SET center_lat = %s, center_lng = %s, size = %s,
+                first_incident_date = LEAST(first_incident_date, %s),
+                last_incident_date = GREATEST(last_incident_date, %s)
+            WHERE id = %s
+        """, (center_lat, center_lng, size, when, when, cluster_id))
+
+    # Index the cluster under both the new member and its moved centre, so
+    # later reports near either find it
+    keys = {cell_key(lat, lng, when), cell_key(center_lat, center_lng, when)}
+    db_cursor.execute(f"""
+        INSERT IGNORE INTO incident_cluster_cells (cell_lat, cell_lng, time_bucket, cluster_id)
+        VALUES {", ".join(["(%s, %s, %s, %s)"] * len(keys))}
+    """, [value for key in sorted(keys) for value in (*key, cluster_id)])
+
+    db_cursor.execute("UPDATE incidents SET cluster_id = %s WHERE id = %s", (cluster_id, incident_id))
+
+    return cluster_id, size
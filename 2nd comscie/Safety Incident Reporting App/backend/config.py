@@ -4,18 +4,32 @@ import os
 from pathlib import Path
 
 class Settings(BaseSettings):
-    # Database
+    # Storage backend: "mysql" or "sqlite" (embedded, see sqlite_storage.py)
+    storage_backend: str = "mysql"
+    sqlite_path: str = str(Path(__file__).parent / "data" / "safety_app.db")
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_synchronous: str = "NORMAL"  # FULL to fsync every commit
+    
+    # Database (MySQL)
     database_host: str = "localhost"
     database_user: str = "root"
-    database_password: str
+    database_password: str = ""
     database_name: str = "safety_app_db"
     database_port: int = 3306
     
+    # Read replicas, comma-separated host:port (same credentials as the primary)
+    database_replicas: str = ""
+    replica_max_lag_seconds: float = 5.0
+    replica_health_check_interval_seconds: float = 5.0
+    read_your_writes_window_seconds: float = 10.0
+    
     # Security
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     encryption_key: str
+    # Optional file caching the PBKDF2-derived key between processes (0600)
+    encryption_key_cache_path: str = ""
     
     # CORS
     cors_origins: str = "http://localhost:3000"
@@ -24,6 +38,64 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Multi-worker server (serve.py)
+    workers: int = 0  # 0 = one per available CPU core
+    worker_timeout_seconds: int = 60
+    worker_graceful_timeout_seconds: int = 30
+    worker_keepalive_seconds: int = 5
+    worker_max_requests: int = 10000
+    worker_max_requests_jitter: int = 1000
+    worker_max_memory_mb: int = 0  # 0 = no address-space limit
+    worker_max_open_files: int = 0  # 0 = inherit
+    pid_file: str = ""
+    
+    # Startup
+    init_db_on_startup: bool = True  # schema DDL is skipped anyway once current
+    startup_budget_seconds: float = 2.0  # cold-start budget checked by startup_profile.py
+    
+    # Write-behind counters (community post likes/comments)
+    counter_flush_interval_seconds: float = 2.0
+    counter_journal_dir: str = str(Path(__file__).parent / "data" / "counters")
+    counter_journal_fsync: bool = False
+    
+    # Incident partitioning and archival (partitions.py)
+    incident_retention_months: int = 12
+    partition_months_ahead: int = 3
+    archive_dir: str = str(Path(__file__).parent / "data" / "archive")
+    
+    # Bulk incident submission
+    batch_max_incidents: int = 100
+    
+    # Group-commit pipeline for POST /incidents
+    write_pipeline_max_batch: int = 50
+    write_pipeline_max_delay_ms: float = 0.0
+    write_pipeline_writers: int = 2
+    write_pipeline_attempts: int = 3  # per batch, on deadlocks / lock wait timeouts
+    
+    # Duplicate incident clustering
+    cluster_radius_meters: float = 250.0
+    cluster_window_minutes: float = 60.0
+    
+    # Admission control / rate limiting. Per worker process: with serve.py's
+    # N workers a client may get up to N times these rates
+    admission_enabled: bool = True
+    admission_max_in_flight: int = 64
+    admission_critical_reserve: int = 16
+    admission_queue_timeout_seconds: float = 2.0
+    admission_max_queue_critical: int = 512
+    admission_max_queue_auth: int = 32
+    admission_max_queue_normal: int = 64
+    admission_max_queue_low: int = 32
+    rate_limit_user_per_second: float = 10.0
+    rate_limit_user_burst: int = 40
+    rate_limit_ip_per_second: float = 20.0
+    rate_limit_ip_burst: int = 80
+    rate_limit_login_per_minute: float = 10.0
+    rate_limit_login_burst: int = 5
+    rate_limit_critical_ip_per_second: float = 100.0
+    rate_limit_critical_ip_burst: int = 400
+    trust_forwarded_for: bool = False
+    
     class Config:
         env_file = Path(__file__).parent / ".env"
         case_sensitive = False
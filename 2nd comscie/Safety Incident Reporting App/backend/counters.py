@@ -0,0 +1,253 @@
+"""
+Write-behind counters for community post likes and comments.
+
+Every increment is appended to a local journal file and added to an in-memory
+delta table. A background thread periodically applies the accumulated deltas
+to community_posts in one batched UPDATE per flush, so a popular post takes
+one row lock per flush instead of one per like. Reads are served as the
+stored column value (read from the primary) plus the pending delta, which
+includes a batch being flushed until its UPDATE commits.
+
+Durability is at-least-once: the journal is only discarded after the batch
+commits, and any journal left behind by a crashed or restarted process is
+replayed on the next start. A crash between the commit and the journal
+cleanup re-applies that batch once.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import get_settings
+from repository import COUNTER_FIELDS, get_repository
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Upper bound on journal slots, i.e. on concurrent processes sharing a journal dir
+MAX_JOURNAL_SLOTS = 64
+
+def _try_lock(handle) -> bool:
+    """Take a non-blocking exclusive lock on an open file"""
+    try:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+class CounterBuffer:
+    """Accumulates counter increments and flushes them in batches"""
+
+    def __init__(self, journal_dir: str, flush_interval: float, fsync: bool = False):
+        self.journal_dir = Path(journal_dir)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self._pending: Dict[int, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+        # Batch being applied by flush(); still counted by pending() until it commits
+        self._in_flight: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._slot_lock = None
+        self._journal = None
+        self._journal_path: Optional[Path] = None
+
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.events = 0
+
+    # Lifecycle
+
+    def start(self):
+        """Claim a journal slot, replay leftovers and start the flush thread"""
+        if self._thread:
+            return
+
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._claim_slot()
+        self._replay()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="counter-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and flush whatever is still pending"""
+        if not self._thread:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        try:
+            self.flush()
+        finally:
+            self._journal.close()
+            self._slot_lock.close()
+            self._journal = None
+            self._slot_lock = None
+
+    def _claim_slot(self):
+        for slot in range(MAX_JOURNAL_SLOTS):
+            handle = open(self.journal_dir / f"counters-{slot}.lock", "a+")
+            if _try_lock(handle):
+                self._slot_lock = handle
+                self._journal_path = self.journal_dir / f"counters-{slot}.journal"
+                return
+            handle.close()
+
+        raise RuntimeError(f"No free counter journal slot in {self.journal_dir}")
+
+    def _replay(self):
+        """Load deltas left by a previous owner of this slot"""
+        flushing_path = self._flushing_path()
+
+        for path in (flushing_path, self._journal_path):
+            if not path.exists():
+                continue
+            with open(path) as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash; the event was never acknowledged
+                        continue
+                    self._pending[entry["p"]][entry["f"]] += entry["d"]
+
+        # Compact the replayed deltas into a fresh journal
+        self._journal = open(self._journal_path, "w")
+        for post_id, deltas in self._pending.items():
+            for field, delta in deltas.items():
+                if delta:
+                    self._write_entry(post_id, field, delta)
+        self._sync_journal(force=True)
+
+        if flushing_path.exists():
+            flushing_path.unlink()
+
+        if self._pending:
+            logger.info(f"Replayed pending counter deltas for {len(self._pending)} posts")
+
+    def _flushing_path(self) -> Path:
+        return self._journal_path.with_name(self._journal_path.name + ".flushing")
+
+    def _write_entry(self, post_id: int, field: str, delta: int):
+        self._journal.write(json.dumps({"p": post_id, "f": field, "d": delta}) + "\n")
+
+    def _sync_journal(self, force: bool = False):
+        self._journal.flush()
+        if force or self.fsync:
+            os.fsync(self._journal.fileno())
+
+    # Counter API
+
+    def increment(self, post_id: int, field: str, delta: int = 1):
+        """Record a counter change; it is applied to the table on the next flush"""
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown counter field: {field}")
+        if self._journal is None:
+            raise RuntimeError("Counter buffer is not started")
+
+        with self._lock:
+            self._write_entry(post_id, field, delta)
+            self._sync_journal()
+            self._pending[post_id][field] += delta
+            self.events += 1
+
+    def pending(self, post_id: int) -> Dict[str, int]:
+        """Deltas recorded for a post but not yet committed to the table"""
+        with self._lock:
+            deltas = dict.fromkeys(COUNTER_FIELDS, 0)
+            for source in (self._pending, self._in_flight):
+                if post_id in source:
+                    for field, delta in source[post_id].items():
+                        deltas[field] += delta
+            return deltas
+
+    def apply_pending(self, row: Dict) -> Dict:
+        """Add pending deltas to a community_posts row read from the database"""
+        deltas = self.pending(row["id"])
+        for field in COUNTER_FIELDS:
+            # The stored value may dip below 0 while another worker still holds
+            # the matching increment; it is an exact sum, only the view is clamped
+            row[field] = max((row.get(field) or 0) + deltas[field], 0)
+        return row
+
+    # Flushing
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Counter flush failed: {e}")
+
+    def flush(self) -> int:
+        """Apply all pending deltas in one transaction; returns rows updated"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+
+                batch = {post_id: deltas for post_id, deltas in self._pending.items() if any(deltas.values())}
+                self._pending.clear()
+                self._in_flight = batch
+
+                # Rotate the journal so new increments don't mix with this batch
+                self._sync_journal(force=True)
+                self._journal.close()
+                os.replace(self._journal_path, self._flushing_path())
+                self._journal = open(self._journal_path, "w")
+
+            try:
+                if batch:
+                    self._apply(batch)
+            except Exception:
+                self._requeue(batch)
+                raise
+
+            with self._lock:
+                self._in_flight = {}
+
+            self._flushing_path().unlink()
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch: Dict[int, Dict[str, int]]):
+        """Put a failed batch back in front of newer increments"""
+        with self._lock:
+            self._in_flight = {}
+            for post_id, deltas in batch.items():
+                for field, delta in deltas.items():
+                    if delta:
+                        self._pending[post_id][field] += delta
+                        self._write_entry(post_id, field, delta)
+            self._sync_journal(force=True)
+
+        self._flushing_path().unlink()
+
+    def _apply(self, batch: Dict[int, Dict[str, int]]):
+        get_repository().add_post_counts(batch)
+
+counter_buffer = CounterBuffer(
+    settings.counter_journal_dir,
+    settings.counter_flush_interval_seconds,
+    settings.counter_journal_fsync,
+)
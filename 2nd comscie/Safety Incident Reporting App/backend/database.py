@@ -1,16 +1,31 @@
 import mysql.connector
 from mysql.connector import Error
 from config import get_settings
-from typing import Optional
+from contextvars import ContextVar
+from typing import Optional, List
+from functools import lru_cache
+import itertools
 import logging
+import threading
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-settings = get_settings()
+# Sort key for severity, most severe first; stored so it can lead an index
+SEVERITY_RANK_SQL = """
+    CASE severity
+        WHEN 'critical' THEN 0
+        WHEN 'high' THEN 1
+        WHEN 'medium' THEN 2
+        WHEN 'low' THEN 3
+        ELSE 4
+    END
+"""
 
 def get_db_connection():
-    """Create and return a database connection"""
+    """Create and return a connection to the primary (all writes go here)"""
+    settings = get_settings()
     try:
         connection = mysql.connector.connect(
             host=settings.database_host,
@@ -27,8 +42,268 @@ def get_db_connection():
         logger.error(f"Error connecting to MySQL: {e}")
         raise
 
-def init_database():
-    """Initialize database with required tables"""
+# Composite indexes behind the moderator triage queue. The equality columns
+# come first, then exactly the ORDER BY severity_rank, created_at, id, so
+# pages are read in index order without a filesort; the trailing columns
+# cover the remaining filters, so a page is resolved from the index alone
+# and only the rows on the page are read from the table.
+TRIAGE_INDEXES = [
+    ("idx_triage_status", "status, severity_rank, created_at, id, incident_date, incident_type"),
+    ("idx_triage_type", "incident_type, status, severity_rank, created_at, id, incident_date"),
+]
+
+# Read replicas
+#
+# Read-only work can go to a replica via get_read_connection(). A replica is
+# only used while its last health check succeeded and its replication lag is
+# within replica_max_lag_seconds; otherwise reads fall back to the primary.
+# After a user writes, their reads stay on the primary for
+# read_your_writes_window_seconds so they always see their own changes.
+# The time of the write travels with the client (a cookie / header, see
+# read_your_writes.py), so the pin holds whichever worker or host serves
+# the next request; a per-process pin covers clients that drop it. Either
+# way the window should comfortably exceed the lag limit.
+
+class Replica:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self.check_lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.host}:{self.port}"
+
+def parse_replicas(value: str) -> List[Replica]:
+    """Parse a comma-separated host:port list"""
+    replicas = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        replicas.append(Replica(host, int(port) if port else get_settings().database_port))
+    return replicas
+
+@lru_cache()
+def get_replicas() -> List[Replica]:
+    """Configured replicas, parsed on first use"""
+    return parse_replicas(get_settings().database_replicas)
+
+@lru_cache()
+def _replica_cycle():
+    return itertools.cycle(get_replicas())
+
+_write_pins = {}
+_write_pins_lock = threading.Lock()
+_write_pins_prune_at = 0.0
+
+class ClientPin:
+    """Last write of the client behind the current request (epoch seconds)"""
+
+    __slots__ = ("last_write", "wrote")
+
+    def __init__(self, last_write: Optional[float] = None):
+        self.last_write = last_write
+        self.wrote = False
+
+# Set per request by read_your_writes.ReadYourWritesMiddleware
+client_pin: ContextVar[Optional[ClientPin]] = ContextVar("client_pin", default=None)
+
+def connect_replica(replica: Replica):
+    settings = get_settings()
+    return mysql.connector.connect(
+        host=replica.host,
+        user=settings.database_user,
+        password=settings.database_password,
+        database=settings.database_name,
+        port=replica.port,
+        connection_timeout=2
+    )
+
+def check_replica(replica: Replica):
+    """Refresh a replica's health and replication lag"""
+    connection = None
+    try:
+        connection = connect_replica(replica)
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            # MySQL < 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+        cursor.close()
+        
+        lag = None
+        if status:
+            lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        
+        # NULL lag means the replication threads are stopped
+        replica.lag = float(lag) if lag is not None else None
+        replica.healthy = replica.lag is not None and replica.lag <= get_settings().replica_max_lag_seconds
+        
+        if not replica.healthy:
+            logger.warning(f"Replica {replica} unusable, lag: {replica.lag}")
+            
+    except Error as e:
+        replica.healthy = False
+        logger.warning(f"Replica {replica} health check failed: {e}")
+        
+    finally:
+        replica.checked_at = time.monotonic()
+        if connection and connection.is_connected():
+            connection.close()
+
+def _refresh_if_stale(replica: Replica):
+    if time.monotonic() - replica.checked_at < get_settings().replica_health_check_interval_seconds:
+        return
+    # One caller re-checks, the others keep using the last known state
+    if replica.check_lock.acquire(blocking=False):
+        try:
+            check_replica(replica)
+        finally:
+            replica.check_lock.release()
+
+def record_write(pin_key: Optional[str]):
+    """Pin a user's reads to the primary after they write"""
+    global _write_pins_prune_at
+    if not get_replicas():
+        return
+    
+    window = get_settings().read_your_writes_window_seconds
+    pin = client_pin.get()
+    if pin is not None:
+        pin.last_write = time.time()
+        pin.wrote = True
+    
+    if not pin_key:
+        return
+    with _write_pins_lock:
+        now = time.monotonic()
+        _write_pins[pin_key] = now + window
+        # Users who never read again would otherwise stay in the dict forever
+        if now >= _write_pins_prune_at:
+            for key in [key for key, until in _write_pins.items() if until < now]:
+                del _write_pins[key]
+            _write_pins_prune_at = now + window
+
+def is_pinned_to_primary(pin_key: Optional[str]) -> bool:
+    pin = client_pin.get()
+    if pin is not None and pin.last_write is not None:
+        # A timestamp from the future is not honoured, so a client can't pin itself forever
+        if 0 <= time.time() - pin.last_write <= get_settings().read_your_writes_window_seconds:
+            return True
+    
+    if not pin_key:
+        return False
+    with _write_pins_lock:
+        until = _write_pins.get(pin_key)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            del _write_pins[pin_key]
+            return False
+        return True
+
+def get_read_connection(pin_key: Optional[str] = None):
+    """Connection for read-only queries: a healthy replica, else the primary"""
+    replicas = get_replicas()
+    if not replicas or is_pinned_to_primary(pin_key):
+        return get_db_connection()
+    
+    for _ in range(len(replicas)):
+        replica = next(_replica_cycle())
+        _refresh_if_stale(replica)
+        if not replica.healthy:
+            continue
+        try:
+            return connect_replica(replica)
+        except Error as e:
+            replica.healthy = False
+            replica.checked_at = time.monotonic()
+            logger.warning(f"Replica {replica} connection failed, trying next: {e}")
+    
+    return get_db_connection()
+
+def get_replica_status() -> List[dict]:
+    """Last known state of each replica"""
+    return [
+        {"replica": str(replica), "healthy": replica.healthy, "lag_seconds": replica.lag}
+        for replica in get_replicas()
+    ]
+
+def add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table (CREATE TABLE IF NOT EXISTS won't)"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Added column {table}.{column}")
+
+def add_index_if_missing(cursor, table: str, name: str, columns: str):
+    """Create an index on an existing table"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, name))
+    
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+        logger.info(f"Added index {table}.{name}")
+
+def replace_index_if_changed(cursor, table: str, name: str, columns: str):
+    """Create an index, or rebuild it if it exists with other columns"""
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        ORDER BY SEQ_IN_INDEX
+    """, (table, name))
+    existing = [row[0] for row in cursor.fetchall()]
+    
+    if not existing:
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+        logger.info(f"Added index {table}.{name}")
+    elif existing != [column.strip() for column in columns.split(",")]:
+        # One statement, so the table is never without the index
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}, ADD INDEX {name} ({columns})")
+        logger.info(f"Rebuilt index {table}.{name}")
+
+def drop_index_if_exists(cursor, table: str, name: str):
+    """Drop an index if an existing table still has it"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, name))
+    
+    if cursor.fetchone()[0] > 0:
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+        logger.info(f"Dropped index {table}.{name}")
+
+# Bump whenever init_database() creates or migrates anything new; startup
+# skips the DDL below when the database already records this version
+SCHEMA_VERSION = 3
+
+def get_schema_version(cursor) -> int:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            id TINYINT PRIMARY KEY,
+            version INT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_version WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def init_database(force: bool = False):
+    """Initialize database with required tables (skipped if already current)"""
+    settings = get_settings()
     connection = None
     cursor = None
     try:
@@ -46,6 +321,11 @@ def init_database():
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {settings.database_name}")
         cursor.execute(f"USE {settings.database_name}")
         
+        current_version = get_schema_version(cursor)
+        if current_version >= SCHEMA_VERSION and not force:
+            logger.info(f"Database schema is current (version {current_version})")
+            return
+        
         # Users table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -64,7 +344,8 @@ def init_database():
         """)
         
         # Incidents table (encrypted data)
-        cursor.execute("""
+        triage_indexes = ",\n".join(f"INDEX {name} ({columns})" for name, columns in TRIAGE_INDEXES)
+        cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS incidents (
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 user_id INT NOT NULL,
@@ -77,12 +358,62 @@ def init_database():
                 location_address_encrypted TEXT,
                 incident_date DATETIME NOT NULL,
                 status VARCHAR(50) DEFAULT 'reported',
+                severity_rank TINYINT AS ({SEVERITY_RANK_SQL}) STORED,
+                cluster_id INT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
                 INDEX idx_user_id (user_id),
-                INDEX idx_status (status),
-                INDEX idx_incident_date (incident_date)
+                INDEX idx_incident_date (incident_date),
+                INDEX idx_cluster_id (cluster_id),
+                {triage_indexes}
+            )
+        """)
+        
+        # Duplicate-report clusters (see clustering.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_clusters (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                center_lat DECIMAL(10, 8) NOT NULL,
+                center_lng DECIMAL(11, 8) NOT NULL,
+                first_incident_date DATETIME NOT NULL,
+                last_incident_date DATETIME NOT NULL,
+                size INT NOT NULL DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Client idempotency keys of submitted incidents (batch endpoint)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_submissions (
+                user_id INT NOT NULL,
+                client_key VARCHAR(64) NOT NULL,
+                incident_id INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, client_key)
+            )
+        """)
+        
+        # Incidents moved out to archive files (see partitions.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_archive (
+                incident_id INT PRIMARY KEY,
+                user_id INT NOT NULL,
+                archive_month DATE NOT NULL,
+                INDEX idx_user_id (user_id)
+            )
+        """)
+        
+        # Spatio-temporal grid index: which clusters have members in which cell
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_cluster_cells (
+                cell_lat INT NOT NULL,
+                cell_lng INT NOT NULL,
+                time_bucket INT NOT NULL,
+                cluster_id INT NOT NULL,
+                PRIMARY KEY (cell_lat, cell_lng, time_bucket, cluster_id),
+                FOREIGN KEY (cluster_id) REFERENCES incident_clusters(id) ON DELETE CASCADE
             )
         """)
         
@@ -130,6 +461,8 @@ def init_database():
                 content_encrypted TEXT NOT NULL,
                 post_type VARCHAR(100) DEFAULT 'general',
                 is_anonymous BOOLEAN DEFAULT FALSE,
+                likes_count INT DEFAULT 0,
+                comments_count INT DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
@@ -138,6 +471,35 @@ def init_database():
             )
         """)
         
+        # Who liked which post, so a user's like is counted once
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS post_likes (
+                post_id INT NOT NULL,
+                user_id INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (post_id, user_id),
+                FOREIGN KEY (post_id) REFERENCES community_posts(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                INDEX idx_user_id (user_id)
+            )
+        """)
+        
+        # Columns added after the first release
+        add_column_if_missing(cursor, "community_posts", "likes_count", "INT DEFAULT 0")
+        add_column_if_missing(cursor, "community_posts", "comments_count", "INT DEFAULT 0")
+        add_column_if_missing(cursor, "incidents", "severity_rank", f"TINYINT AS ({SEVERITY_RANK_SQL}) STORED")
+        for name, columns in TRIAGE_INDEXES:
+            replace_index_if_changed(cursor, "incidents", name, columns)
+        # Redundant with the prefix of idx_triage_status
+        drop_index_if_exists(cursor, "incidents", "idx_status")
+        add_column_if_missing(cursor, "incidents", "cluster_id", "INT NULL")
+        add_index_if_missing(cursor, "incidents", "idx_cluster_id", "cluster_id")
+        
+        cursor.execute("""
+            INSERT INTO schema_version (id, version) VALUES (1, %s)
+            ON DUPLICATE KEY UPDATE version = VALUES(version)
+        """, (SCHEMA_VERSION,))
+        
         connection.commit()
         logger.info("Database initialized successfully")
         
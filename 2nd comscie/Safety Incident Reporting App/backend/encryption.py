@@ -2,39 +2,130 @@ from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
 import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
 from config import get_settings
 
-settings = get_settings()
+logger = logging.getLogger(__name__)
 
-def get_encryption_key() -> bytes:
-    """Derive encryption key from settings"""
+KDF_SALT = b'safety_app_salt'  # In production, use a random salt stored securely
+KDF_ITERATIONS = 100000
+
+def derive_encryption_key(secret: str) -> bytes:
+    """Run the PBKDF2 derivation (deliberately slow)"""
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
-        salt=b'safety_app_salt',  # In production, use a random salt stored securely
-        iterations=100000,
+        salt=KDF_SALT,
+        iterations=KDF_ITERATIONS,
         backend=default_backend()
     )
-    key = base64.urlsafe_b64encode(kdf.derive(settings.encryption_key.encode()))
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+def _key_check(key: bytes, secret: str) -> str:
+    # Keyed by the derived key itself: only whoever already holds the key can
+    # produce or verify it, so the cache file adds no shortcut around PBKDF2
+    message = secret.encode() + KDF_SALT + str(KDF_ITERATIONS).encode()
+    return hmac.new(base64.urlsafe_b64decode(key), message, hashlib.sha256).hexdigest()
+
+def _read_cached_key(path: Path, secret: str) -> Optional[bytes]:
+    try:
+        cached = json.loads(path.read_text())
+        key = cached["key"].encode()
+        if hmac.compare_digest(cached["check"], _key_check(key, secret)):
+            return key
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def _write_cached_key(path: Path, secret: str, key: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    # Owner-only, same sensitivity as the ENCRYPTION_KEY in .env
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"key": key.decode(), "check": _key_check(key, secret)}, f)
+    os.replace(tmp_path, path)
+
+@lru_cache()
+def get_encryption_key() -> bytes:
+    """Derive encryption key from settings (once per process, or cached on disk)"""
+    settings = get_settings()
+    secret = settings.encryption_key
+    
+    cache_path = Path(settings.encryption_key_cache_path) if settings.encryption_key_cache_path else None
+    if cache_path:
+        key = _read_cached_key(cache_path, secret)
+        if key:
+            return key
+    
+    key = derive_encryption_key(secret)
+    
+    if cache_path:
+        try:
+            _write_cached_key(cache_path, secret, key)
+        except OSError as e:
+            logger.warning(f"Could not cache derived encryption key: {e}")
+    
     return key
 
-# Initialize Fernet cipher
-cipher = Fernet(get_encryption_key())
+@lru_cache()
+def get_cipher() -> Fernet:
+    """Fernet cipher, created on first use"""
+    return Fernet(get_encryption_key())
 
 def encrypt_data(data: str) -> str:
     """Encrypt sensitive data using AES-256"""
     if not data:
         return ""
-    encrypted = cipher.encrypt(data.encode())
+    encrypted = get_cipher().encrypt(data.encode())
     return encrypted.decode()
 
+# Batches smaller than this are encrypted inline, thread hand-off costs more
+PARALLEL_ENCRYPT_MIN_ITEMS = 16
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def encrypt_many(values: List[Optional[str]]) -> List[Optional[str]]:
+    """Encrypt a batch of values, spread over worker threads; None stays None"""
+    global _executor
+    
+    def encrypt_value(value: Optional[str]) -> Optional[str]:
+        return encrypt_data(value) if value is not None else None
+    
+    if len(values) < PARALLEL_ENCRYPT_MIN_ITEMS:
+        return [encrypt_value(value) for value in values]
+    
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="encrypt")
+    
+    return list(_executor.map(encrypt_value, values, chunksize=8))
+
+def encrypt_bytes(data: bytes) -> bytes:
+    """Encrypt a binary blob (e.g. an archive file)"""
+    return get_cipher().encrypt(data)
+
+def decrypt_bytes(encrypted_data: bytes) -> bytes:
+    """Decrypt a binary blob"""
+    try:
+        return get_cipher().decrypt(encrypted_data)
+    except Exception as e:
+        raise ValueError(f"Decryption failed: {str(e)}")
+
 def decrypt_data(encrypted_data: str) -> str:
     """Decrypt encrypted data"""
     if not encrypted_data:
         return ""
     try:
-        decrypted = cipher.decrypt(encrypted_data.encode())
+        decrypted = get_cipher().decrypt(encrypted_data.encode())
         return decrypted.decode()
     except Exception as e:
         raise ValueError(f"Decryption failed: {str(e)}")
@@ -0,0 +1,148 @@
+"""
+Batched incident inserts.
+
+insert_incidents() writes any number of already-encrypted incidents with one
+multi-row INSERT and returns their generated ids. InnoDB hands a multi-row
+INSERT with a known row count one consecutive block of auto-increment
+values (in every innodb_autoinc_lock_mode), so the ids follow from
+lastrowid and @@auto_increment_increment without reading the rows back.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from clustering import assign_cluster
+from encryption import encrypt_many
+
+INSERT_COLUMNS = (
+    "user_id", "title", "description_encrypted", "incident_type", "severity",
+    "location_lat", "location_lng", "location_address_encrypted", "incident_date", "created_at",
+)
+
+def encrypt_incidents(incidents: Sequence[Any]) -> List[tuple]:
+    """(description_encrypted, location_address_encrypted) for each incident"""
+    values = []
+    for incident in incidents:
+        values.append(incident.description)
+        values.append(incident.location_address or None)
+
+    encrypted = encrypt_many(values)
+    return [(encrypted[i], encrypted[i + 1]) for i in range(0, len(encrypted), 2)]
+
+def database_now(cursor) -> datetime:
+    """Current time on the database server, used as created_at"""
+    cursor.execute("SELECT NOW()")
+    row = cursor.fetchone()
+    now = row["NOW()"] if isinstance(row, dict) else row[0]
+    # SQLite returns it as text
+    return now if isinstance(now, datetime) else datetime.fromisoformat(now)
+
+def insert_incidents(cursor, user_ids: Sequence[int], incidents: Sequence[Any],
+                     encrypted: Sequence[tuple], created_at: datetime) -> List[int]:
+    """Insert incidents with one multi-row INSERT and return their ids in order"""
+    if not incidents:
+        return []
+
+    rows = []
+    for user_id, incident, (description, address) in zip(user_ids, incidents, encrypted):
+        rows.extend((
+            user_id,
+            incident.title,
+            description,
+            incident.incident_type,
+            incident.severity,
+            incident.location_lat,
+            incident.location_lng,
+            address,
+            incident.incident_date,
+            created_at,
+        ))
+
+    placeholders = "(" + ", ".join(["%s"] * len(INSERT_COLUMNS)) + ")"
+    cursor.execute(f"""
+        INSERT INTO incidents ({", ".join(INSERT_COLUMNS)})
+        VALUES {", ".join([placeholders] * len(incidents))}
+    """, rows)
+
+    # lastrowid is the id of the first row of a multi-row INSERT
+    first_id = cursor.lastrowid
+    if len(incidents) == 1:
+        return [first_id]
+
+    cursor.execute("SELECT @@auto_increment_increment")
+    row = cursor.fetchone()
+    step = list(row.values())[0] if isinstance(row, dict) else row[0]
+    return [first_id + i * step for i in range(len(incidents))]
+
+def incident_response(incident_id: int, incident: Any, created_at: datetime,
+                      cluster_id: Optional[int] = None, cluster_size: Optional[int] = None) -> Dict[str, Any]:
+    """API response for a just-inserted incident, built from the request itself"""
+    return {
+        "id": incident_id,
+        "title": incident.title,
+        "description": incident.description,
+        "incident_type": incident.incident_type,
+        "severity": incident.severity,
+        "location_lat": incident.location_lat,
+        "location_lng": incident.location_lng,
+        "location_address": incident.location_address or None,
+        "incident_date": incident.incident_date,
+        "status": "reported",
+        "created_at": created_at,
+        "cluster_id": cluster_id,
+        "cluster_size": cluster_size,
+    }
+
+def submit_idempotent(cursor, user_id: int, items: Sequence[Any], encrypted: Sequence[tuple]) -> Dict[str, Dict[str, Any]]:
+    """
+    Insert the items whose client_key this user hasn't submitted before, in
+    the caller's transaction. Returns a result per client_key. Items must
+    have unique client keys.
+    """
+    keys = [item.client_key for item in items]
+    placeholders = ", ".join(["%s"] * len(keys))
+
+    # Locks the keys (and the gaps where new ones go) until commit, so a
+    # concurrent replay of the same batch waits and then sees our rows
+    cursor.execute(f"""
+        SELECT client_key, incident_id FROM incident_submissions
+        WHERE user_id = %s AND client_key IN ({placeholders})
+        FOR UPDATE
+    """, [user_id, *keys])
+    existing = {row["client_key"]: row["incident_id"] for row in cursor.fetchall()}
+
+    results = {
+        key: {"client_key": key, "status": "duplicate", "incident_id": incident_id, "incident": None}
+        for key, incident_id in existing.items()
+    }
+
+    new_items = [(item, enc) for item, enc in zip(items, encrypted) if item.client_key not in existing]
+    if not new_items:
+        return results
+
+    created_at = database_now(cursor)
+    incident_ids = insert_incidents(
+        cursor,
+        [user_id] * len(new_items),
+        [item for item, _ in new_items],
+        [enc for _, enc in new_items],
+        created_at,
+    )
+
+    for (item, _), incident_id in zip(new_items, incident_ids):
+        cluster_id, cluster_size = assign_cluster(
+            cursor, incident_id, item.location_lat, item.location_lng, item.incident_date
+        )
+        results[item.client_key] = {
+            "client_key": item.client_key,
+            "status": "created",
+            "incident_id": incident_id,
+            "incident": incident_response(incident_id, item, created_at, cluster_id, cluster_size),
+        }
+
+    cursor.execute(f"""
+        INSERT INTO incident_submissions (user_id, client_key, incident_id)
+        VALUES {", ".join(["(%s, %s, %s)"] * len(new_items))}
+    """, [value for (item, _), incident_id in zip(new_items, incident_ids)
+          for value in (user_id, item.client_key, incident_id)])
+
+    return results
@@ -26,6 +26,9 @@ DB_CONFIG = {
 
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'safety_app_db')
 
+# Pass --partition to range-partition incidents by month (see partitions.py)
+PARTITION_INCIDENTS = '--partition' in sys.argv
+
 def create_database_and_tables():
     """Create database and all required tables"""
     connection = None
@@ -87,17 +90,74 @@ def create_database_and_tables():
                 location_address_encrypted TEXT,
                 incident_date DATETIME NOT NULL,
                 status VARCHAR(50) DEFAULT 'reported',
+                severity_rank TINYINT AS (
+                    CASE severity
+                        WHEN 'critical' THEN 0
+                        WHEN 'high' THEN 1
+                        WHEN 'medium' THEN 2
+                        WHEN 'low' THEN 3
+                        ELSE 4
+                    END
+                ) STORED,
+                cluster_id INT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
                 INDEX idx_user_id (user_id),
-                INDEX idx_status (status),
                 INDEX idx_incident_date (incident_date),
-                INDEX idx_incident_type (incident_type),
-                INDEX idx_severity (severity)
+                INDEX idx_severity (severity),
+                INDEX idx_cluster_id (cluster_id),
+                INDEX idx_triage_status (status, severity_rank, created_at, id, incident_date, incident_type),
+                INDEX idx_triage_type (incident_type, status, severity_rank, created_at, id, incident_date)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
         print("✓ Incidents table created!")
+        
+        # Duplicate-report clusters and their spatio-temporal grid index
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_clusters (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                center_lat DECIMAL(10, 8) NOT NULL,
+                center_lng DECIMAL(11, 8) NOT NULL,
+                first_incident_date DATETIME NOT NULL,
+                last_incident_date DATETIME NOT NULL,
+                size INT NOT NULL DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_cluster_cells (
+                cell_lat INT NOT NULL,
+                cell_lng INT NOT NULL,
+                time_bucket INT NOT NULL,
+                cluster_id INT NOT NULL,
+                PRIMARY KEY (cell_lat, cell_lng, time_bucket, cluster_id),
+                FOREIGN KEY (cluster_id) REFERENCES incident_clusters(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        print("✓ Incident cluster tables created!")
+        
+        # Idempotency keys of incidents submitted through the batch endpoint
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_submissions (
+                user_id INT NOT NULL,
+                client_key VARCHAR(64) NOT NULL,
+                incident_id INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, client_key)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        
+        # Lookup table for incidents moved to archive files
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS incident_archive (
+                incident_id INT PRIMARY KEY,
+                user_id INT NOT NULL,
+                archive_month DATE NOT NULL,
+                INDEX idx_user_id (user_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
         print()
         
         # Create Evidence table
@@ -166,9 +226,31 @@ def create_database_and_tables():
                 INDEX idx_created (created_at)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
+        
+        # Who liked which post
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS post_likes (
+                post_id INT NOT NULL,
+                user_id INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (post_id, user_id),
+                FOREIGN KEY (post_id) REFERENCES community_posts(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                INDEX idx_user_id (user_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
         print("✓ Community Posts table created!")
         print()
         
+        # Optional: monthly range partitioning of incidents. Last: MySQL rejects
+        # creating evidence with its foreign key to a partitioned incidents, so
+        # all tables exist first and partition_incidents() drops that key
+        if PARTITION_INCIDENTS:
+            from partitions import partition_incidents
+            partition_incidents(cursor)
+            print("✓ Incidents table partitioned by month!")
+            print()
+        
         # Commit changes
         connection.commit()
         
@@ -180,9 +262,11 @@ def create_database_and_tables():
         print("Tables created:")
         print("  1. users              - User accounts with hashed passwords")
         print("  2. incidents          - Incident reports (encrypted)")
+        print("     incident_clusters  - Duplicate-report clusters (+ grid index)")
         print("  3. evidence           - Evidence files (encrypted)")
         print("  4. safety_zones       - Safety zone markers")
         print("  5. community_posts    - Community posts (encrypted)")
+        print("     post_likes         - One row per user like")
         print()
         print("All sensitive data fields are configured for encryption.")
         print("Password hashing will be handled by the backend API.")
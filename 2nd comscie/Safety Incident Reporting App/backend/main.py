@@ -1,16 +1,11 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
-import mysql.connector
-from mysql.connector import Error
-from mysql.connector.cursor import MySQLCursorDict
-from mysql.connector.connection import MySQLConnection
 
 from config import get_settings
-from database import get_db_connection, init_database
 from auth import (
     verify_password,
     get_password_hash,
@@ -18,11 +13,26 @@ from auth import (
     decode_access_token,
     Token
 )
-from encryption import encrypt_data, decrypt_data
+from encryption import decrypt_data
+from counters import counter_buffer
+from admission import AdmissionMiddleware, get_admission_metrics
+from read_your_writes import ReadYourWritesMiddleware
+from incident_writes import encrypt_incidents
+from repository import get_repository
+from storage import StorageError
+from write_pipeline import write_pipeline
+from triage import TRIAGE_ROLES, MAX_BULK_TRANSITION
 
 settings = get_settings()
+repository = get_repository()
 app = FastAPI(title="Safety Incident Reporting API")
 
+# Hands clients the time of their last write so any worker keeps their reads on the primary
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Admission control (added first so CORS headers still wrap 429/503 responses)
+app.add_middleware(AdmissionMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Last-Write"],
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -71,9 +82,59 @@ class IncidentResponse(BaseModel):
     incident_date: datetime
     status: str
     created_at: datetime
+    cluster_id: Optional[int] = None
+    cluster_size: Optional[int] = None
+
+class BatchIncidentItem(IncidentCreate):
+    client_key: str = Field(..., min_length=1, max_length=64)
+
+class BatchIncidentRequest(BaseModel):
+    incidents: List[BatchIncidentItem]
+
+class BatchItemResult(BaseModel):
+    client_key: str
+    status: str
+    incident_id: int
+    incident: Optional[IncidentResponse] = None
+
+class BatchIncidentResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class TriageIncidentResponse(IncidentResponse):
+    user_id: int
+
+class TriagePage(BaseModel):
+    items: List[TriageIncidentResponse]
+    next_cursor: Optional[str]
+
+class StatusTransitionRequest(BaseModel):
+    incident_ids: List[int]
+    status: str
+
+class StatusTransitionResponse(BaseModel):
+    status: str
+    updated: List[int]
+    unchanged: List[int]
+    invalid_transition: List[int]
+    not_found: List[int]
 
-# Dependency to get current user
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+class ClusterResponse(BaseModel):
+    id: int
+    center_lat: float
+    center_lng: float
+    first_incident_date: datetime
+    last_incident_date: datetime
+    size: int
+    incident_ids: List[int]
+
+class PostCountsResponse(BaseModel):
+    id: int
+    likes_count: int
+    comments_count: int
+
+# Dependency to get current user. Like every route that hashes or queries,
+# it's a plain def so FastAPI runs it in the thread pool, off the event loop
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -84,205 +145,287 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
     if token_data is None or token_data.username is None:
         raise credentials_exception
     
-    connection: MySQLConnection = get_db_connection()  # type: ignore
-    cursor: MySQLCursorDict = connection.cursor(dictionary=True)  # type: ignore
+    user = repository.get_user_by_username(token_data.username, pin_key=token_data.username)
+    if user is None:
+        raise credentials_exception
     
-    try:
-        cursor.execute("SELECT * FROM users WHERE username = %s", (token_data.username,))
-        user = cursor.fetchone()
-        
-        if user is None:
-            raise credentials_exception
-            
-        return user
-        
-    finally:
-        cursor.close()
-        connection.close()
+    return user
+
+def require_role(*roles: str):
+    """Dependency that only lets users with one of the given roles through"""
+    async def check_role(current_user: dict = Depends(get_current_user)) -> Dict[str, Any]:
+        if current_user.get('role') not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        return current_user
+    return check_role
+
+def decrypt_incident(incident: Dict[str, Any]) -> Dict[str, Any]:
+    """Add decrypted description and address to an incidents row"""
+    incident['description'] = decrypt_data(incident['description_encrypted'])
+    incident['location_address'] = decrypt_data(incident['location_address_encrypted']) if incident['location_address_encrypted'] else None
+    return incident
 
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    init_database()
+    if settings.init_db_on_startup:
+        repository.init_schema()
+    counter_buffer.start()
+    await write_pipeline.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await write_pipeline.stop()
+    counter_buffer.stop()
 
 # Health check
 @app.get("/")
 async def root():
     return {"message": "Safety Incident Reporting API", "status": "running"}
 
+@app.get("/metrics/admission")
+async def admission_metrics():
+    return get_admission_metrics()
+
+@app.get("/metrics/write-pipeline")
+async def write_pipeline_metrics():
+    return write_pipeline.metrics()
+
+@app.get("/health/replicas")
+def replica_health(current_user: dict = Depends(require_role("admin"))):
+    return repository.status()
+
 # Authentication Routes
 @app.post("/auth/register", response_model=UserResponse)
-async def register(user: UserCreate):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+def register(user: UserCreate):
+    # Hash password (slow, so outside the transaction)
+    hashed_password = get_password_hash(user.password)
     
     try:
-        # Check if user exists
-        cursor.execute("SELECT id FROM users WHERE email = %s OR username = %s", 
-                      (user.email, user.username))
-        
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email or username already registered"
-            )
-        
-        # Hash password
-        hashed_password = get_password_hash(user.password)
-        
-        # Insert user
-        cursor.execute("""
-            INSERT INTO users (email, username, full_name, hashed_password)
-            VALUES (%s, %s, %s, %s)
-        """, (user.email, user.username, user.full_name, hashed_password))
-        
-        connection.commit()
-        user_id = cursor.lastrowid
-        
-        # Fetch created user
-        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        new_user = cursor.fetchone()
-        
-        return new_user
+        new_user = repository.create_user(user.email, user.username, user.full_name, hashed_password)
         
-    except Error as e:
-        connection.rollback()
+    except StorageError as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-        
-    finally:
-        cursor.close()
-        connection.close()
+    
+    if new_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already registered"
+        )
+    
+    repository.record_write(user.username)
+    
+    return new_user
 
 @app.post("/auth/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    # Primary only: a user who just registered must be able to log in at once
+    user = repository.get_user_by_username(form_data.username, primary=True)
     
-    try:
-        cursor.execute("SELECT * FROM users WHERE username = %s", (form_data.username,))
-        user = cursor.fetchone()
-        
-        if not user or not verify_password(form_data.password, user['hashed_password']):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-        access_token = create_access_token(
-            data={"sub": user['username']}, expires_delta=access_token_expires
+    if not user or not verify_password(form_data.password, user['hashed_password']):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        
-        return {"access_token": access_token, "token_type": "bearer"}
-        
-    finally:
-        cursor.close()
-        connection.close()
+    
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_access_token(
+        data={"sub": user['username']}, expires_delta=access_token_expires
+    )
+    
+    return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: dict = Depends(get_current_user)):
+def get_current_user_info(current_user: dict = Depends(get_current_user)):
     return current_user
 
 # Incident Routes
 @app.post("/incidents", response_model=IncidentResponse)
 async def create_incident(incident: IncidentCreate, current_user: dict = Depends(get_current_user)):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+    # Encrypted, inserted, clustered and committed together with concurrent
+    # submissions; the response is built from the plaintext we already have
     try:
-        # Encrypt sensitive data
-        encrypted_description = encrypt_data(incident.description)
-        encrypted_address = encrypt_data(incident.location_address) if incident.location_address else None
-        
-        cursor.execute("""
-            INSERT INTO incidents 
-            (user_id, title, description_encrypted, incident_type, severity, 
-             location_lat, location_lng, location_address_encrypted, incident_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            current_user['id'],
-            incident.title,
-            encrypted_description,
-            incident.incident_type,
-            incident.severity,
-            incident.location_lat,
-            incident.location_lng,
-            encrypted_address,
-            incident.incident_date
-        ))
-        
-        connection.commit()
-        incident_id = cursor.lastrowid
-        
-        # Fetch created incident
-        cursor.execute("SELECT * FROM incidents WHERE id = %s", (incident_id,))
-        new_incident = cursor.fetchone()
-        
-        # Decrypt data for response
-        new_incident['description'] = decrypt_data(new_incident['description_encrypted'])
-        new_incident['location_address'] = decrypt_data(new_incident['location_address_encrypted']) if new_incident['location_address_encrypted'] else None
+        new_incident = await write_pipeline.submit(current_user['id'], incident)
         
-        return new_incident
-        
-    except Error as e:
-        connection.rollback()
+    except StorageError as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-        
-    finally:
-        cursor.close()
-        connection.close()
+    
+    repository.record_write(current_user['username'])
+    
+    return new_incident
 
-@app.get("/incidents", response_model=List[IncidentResponse])
-async def get_incidents(current_user: dict = Depends(get_current_user)):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+@app.post("/incidents/batch", response_model=BatchIncidentResponse)
+def create_incidents_batch(batch: BatchIncidentRequest, current_user: dict = Depends(get_current_user)):
+    """Submit queued offline reports; replaying a client_key never creates a duplicate"""
+    if not batch.incidents:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No incidents given")
+    if len(batch.incidents) > settings.batch_max_incidents:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.batch_max_incidents} incidents per request"
+        )
+    
+    # First occurrence of a key within the request wins, in the client's queue order
+    unique = {}
+    for item in batch.incidents:
+        unique.setdefault(item.client_key, item)
+    unique_items = list(unique.values())
+    
+    # Encrypt before opening the transaction so no locks are held meanwhile
+    encrypted = encrypt_incidents(unique_items)
     
     try:
-        cursor.execute("""
-            SELECT * FROM incidents 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC
-        """, (current_user['id'],))
-        
-        incidents = cursor.fetchall()
-        
-        # Decrypt sensitive data
-        for incident in incidents:
-            incident['description'] = decrypt_data(incident['description_encrypted'])
-            incident['location_address'] = decrypt_data(incident['location_address_encrypted']) if incident['location_address_encrypted'] else None
+        results = repository.submit_batch(current_user['id'], unique_items, encrypted)
         
-        return incidents
-        
-    finally:
-        cursor.close()
-        connection.close()
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    
+    repository.record_write(current_user['username'])
+    
+    response = []
+    seen = set()
+    for item in batch.incidents:
+        result = results[item.client_key]
+        if item.client_key in seen:
+            result = {**result, "status": "duplicate", "incident": None}
+        seen.add(item.client_key)
+        response.append(result)
+    
+    return {"results": response}
+
+@app.get("/incidents", response_model=List[IncidentResponse])
+def get_incidents(current_user: dict = Depends(get_current_user)):
+    incidents = repository.list_incidents(current_user['id'], pin_key=current_user['username'])
+    
+    # Decrypt sensitive data
+    return [decrypt_incident(incident) for incident in incidents]
 
 @app.get("/incidents/{incident_id}", response_model=IncidentResponse)
-async def get_incident(incident_id: int, current_user: dict = Depends(get_current_user)):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+def get_incident(incident_id: int, current_user: dict = Depends(get_current_user)):
+    incident = repository.get_incident(incident_id, current_user['id'], pin_key=current_user['username'])
+    
+    if not incident:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incident not found")
     
+    # Decrypt sensitive data
+    return decrypt_incident(incident)
+
+# Triage Routes (moderators/responders, across all users)
+@app.get("/triage/incidents", response_model=TriagePage)
+def get_triage_queue(
+    status_filter: str = Query("reported", alias="status"),
+    severity: Optional[List[str]] = Query(None),
+    incident_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(require_role(*TRIAGE_ROLES))
+):
     try:
-        cursor.execute("""
-            SELECT * FROM incidents 
-            WHERE id = %s AND user_id = %s
-        """, (incident_id, current_user['id']))
-        
-        incident = cursor.fetchone()
-        
-        if not incident:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incident not found")
+        incidents, next_cursor = repository.triage_page(
+            status_filter,
+            pin_key=current_user['username'],
+            severities=severity,
+            incident_type=incident_type,
+            date_from=date_from,
+            date_to=date_to,
+            after=cursor,
+            limit=limit
+        )
         
-        # Decrypt sensitive data
-        incident['description'] = decrypt_data(incident['description_encrypted'])
-        incident['location_address'] = decrypt_data(incident['location_address_encrypted']) if incident['location_address_encrypted'] else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return {
+        "items": [decrypt_incident(incident) for incident in incidents],
+        "next_cursor": next_cursor
+    }
+
+@app.post("/triage/incidents/status", response_model=StatusTransitionResponse)
+def bulk_transition_status(
+    request: StatusTransitionRequest,
+    current_user: dict = Depends(require_role(*TRIAGE_ROLES))
+):
+    if not request.incident_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No incidents given")
+    if len(request.incident_ids) > MAX_BULK_TRANSITION:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_TRANSITION} incidents per request"
+        )
+    
+    try:
+        result = repository.transition_status(request.incident_ids, request.status)
         
-        return incident
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         
-    finally:
-        cursor.close()
-        connection.close()
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    
+    repository.record_write(current_user['username'])
+    
+    return {"status": request.status, **result}
+
+@app.get("/triage/clusters/{cluster_id}", response_model=ClusterResponse)
+def get_cluster(cluster_id: int, current_user: dict = Depends(require_role(*TRIAGE_ROLES))):
+    cluster = repository.get_cluster(cluster_id, pin_key=current_user['username'])
+    
+    if not cluster:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cluster not found")
+    
+    return cluster
+
+# Community Routes
+def get_post_counts(post_id: int) -> Dict[str, Any]:
+    """Stored counters for a post plus deltas not yet flushed"""
+    # Primary: a lagging replica would miss deltas already flushed
+    try:
+        post = repository.get_post_counts(post_id, primary=True)
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    
+    if not post:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    
+    return counter_buffer.apply_pending(post)
+
+@app.get("/community/posts/{post_id}/counts", response_model=PostCountsResponse)
+def get_post_counts_route(post_id: int, current_user: dict = Depends(get_current_user)):
+    return get_post_counts(post_id)
+
+@app.post("/community/posts/{post_id}/like", response_model=PostCountsResponse)
+def like_post(post_id: int, current_user: dict = Depends(get_current_user)):
+    counts = get_post_counts(post_id)
+    
+    try:
+        liked = repository.add_like(post_id, current_user['id'])
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    
+    # Liking twice is a no-op
+    if liked:
+        counter_buffer.increment(post_id, "likes_count", 1)
+        counts["likes_count"] += 1
+    return counts
+
+@app.delete("/community/posts/{post_id}/like", response_model=PostCountsResponse)
+def unlike_post(post_id: int, current_user: dict = Depends(get_current_user)):
+    counts = get_post_counts(post_id)
+    
+    try:
+        unliked = repository.remove_like(post_id, current_user['id'])
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    
+    # post_likes is the source of truth: another worker may still hold the
+    # matching +1 unflushed, so the count read here can't veto the decrement
+    if unliked:
+        counter_buffer.increment(post_id, "likes_count", -1)
+        counts["likes_count"] = max(counts["likes_count"] - 1, 0)
+    return counts
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,12 +0,0 @@
-from sqlalchemy import Column, Integer, String
-from .database import Base
-
-class User(Base):
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, index=True)
-    username = Column(String(255), unique=True, index=True)
-    full_name = Column(String(255))
-    hashed_password = Column(String(255))
-    role = Column(String(255))
@@ -0,0 +1,335 @@
+"""
+Monthly partitioning of the incidents table and cold-data archival.
+
+incidents is range-partitioned on incident_date, one partition per month
+(pYYYYMM) plus a catch-all p_future. The hot indexes then only span the
+partitions that are still in use, and removing a month is a metadata-only
+DROP PARTITION instead of a row-by-row DELETE.
+
+The archival job moves every month older than INCIDENT_RETENTION_MONTHS out
+of MySQL: the partition is first swapped (EXCHANGE PARTITION) into a
+staging table no one writes to, whose rows are written as gzip-compressed
+JSON lines, encrypted with the app key (sensitive columns stay encrypted
+inside as well), to ARCHIVE_DIR/incidents-YYYY-MM.json.gz.enc; incident ids
+are recorded in incident_archive; then the emptied partition is dropped,
+unless rows were written to it meanwhile, which are left for the next run.
+load_archived_incident() serves the rare lookup of an archived incident.
+
+MySQL does not allow foreign keys on partitioned tables, so setting up
+partitioning drops the incidents -> users and evidence -> incidents
+foreign keys, and the primary key becomes (id, incident_date).
+
+    python partitions.py setup      # partition an existing incidents table
+    python partitions.py archive    # add upcoming months, archive old ones
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from mysql.connector import Error
+
+from config import get_settings
+from database import get_db_connection
+from encryption import encrypt_bytes, decrypt_bytes
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+DATETIME_COLUMNS = ("incident_date", "created_at", "updated_at")
+DECIMAL_COLUMNS = ("location_lat", "location_lng")
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+def partition_month(name: str) -> date:
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+def partition_clause(month: date) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+
+def list_partitions(cursor) -> List[str]:
+    """Monthly partitions of incidents, oldest first (p_future excluded)"""
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'incidents'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return [row[0] for row in cursor.fetchall() if row[0] != "p_future"]
+
+def is_partitioned(cursor) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'incidents'
+          AND PARTITION_NAME IS NOT NULL
+    """)
+    return cursor.fetchone()[0] > 0
+
+def partition_incidents(cursor):
+    """Convert incidents to monthly range partitions (no-op if already done)"""
+    if is_partitioned(cursor):
+        logger.info("incidents is already partitioned")
+        return
+
+    # Partitioned InnoDB tables can't take part in foreign keys
+    cursor.execute("""
+        SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE()
+          AND (TABLE_NAME = 'incidents' OR REFERENCED_TABLE_NAME = 'incidents')
+    """)
+    for table, constraint in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+        logger.info(f"Dropped foreign key {table}.{constraint}")
+
+    cursor.execute("SELECT MIN(incident_date) FROM incidents")
+    oldest = cursor.fetchone()[0]
+    this_month = month_start(date.today())
+    month = month_start(oldest.date()) if oldest else this_month
+    last = add_months(this_month, settings.partition_months_ahead)
+
+    clauses = []
+    while month <= last:
+        clauses.append(partition_clause(month))
+        month = add_months(month, 1)
+    clauses.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+
+    # Every unique key of a partitioned table must include the partition column
+    cursor.execute("ALTER TABLE incidents DROP PRIMARY KEY, ADD PRIMARY KEY (id, incident_date)")
+    cursor.execute(f"""
+        ALTER TABLE incidents
+        PARTITION BY RANGE COLUMNS (incident_date) (
+            {", ".join(clauses)}
+        )
+    """)
+    logger.info(f"Partitioned incidents into {len(clauses)} partitions")
+
+def ensure_future_partitions(cursor):
+    """Split upcoming months out of p_future so new rows land in their own month"""
+    partitions = list_partitions(cursor)
+    if not partitions:
+        return
+
+    month = add_months(partition_month(partitions[-1]), 1)
+    last = add_months(month_start(date.today()), settings.partition_months_ahead)
+
+    clauses = []
+    while month <= last:
+        clauses.append(partition_clause(month))
+        month = add_months(month, 1)
+
+    if clauses:
+        clauses.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+        cursor.execute(f"""
+            ALTER TABLE incidents REORGANIZE PARTITION p_future INTO (
+                {", ".join(clauses)}
+            )
+        """)
+        logger.info(f"Added {len(clauses) - 1} incident partitions")
+
+def archive_path(month: date) -> Path:
+    return Path(settings.archive_dir) / f"incidents-{month.year:04d}-{month.month:02d}.json.gz.enc"
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+def write_archive(month: date, rows: List[Dict[str, Any]]) -> Path:
+    """Write rows to the month's compressed, encrypted archive file"""
+    path = archive_path(month)
+
+    # A month can be archived in several runs; keep what's already there
+    if path.exists():
+        merged = dict(read_archive(month))
+        merged.update((row["id"], row) for row in rows)
+        rows = list(merged.values())
+
+    payload = "\n".join(json.dumps(row, default=_json_default) for row in rows).encode()
+    data = encrypt_bytes(gzip.compress(payload))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+def read_archive(month: date) -> Dict[int, Dict[str, Any]]:
+    """Archived rows of a month by incident id"""
+    # A later run may merge late rows into the file (a new inode via
+    # os.replace), so every process re-reads it once it has changed
+    stat = archive_path(month).stat()
+    return _read_archive(month, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+@lru_cache(maxsize=4)
+def _read_archive(month: date, inode: int, mtime_ns: int, size: int) -> Dict[int, Dict[str, Any]]:
+    with open(archive_path(month), "rb") as f:
+        payload = gzip.decompress(decrypt_bytes(f.read()))
+
+    rows = {}
+    for line in payload.decode().splitlines():
+        row = json.loads(line)
+        for column in DATETIME_COLUMNS:
+            if row.get(column):
+                row[column] = datetime.fromisoformat(row[column])
+        for column in DECIMAL_COLUMNS:
+            if row.get(column) is not None:
+                row[column] = Decimal(row[column])
+        rows[row["id"]] = row
+    return rows
+
+def table_exists(cursor, table: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) AS count FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return cursor.fetchone()["count"] > 0
+
+def archive_partition(connection, name: str) -> int:
+    """Move one monthly partition to its archive file and drop it"""
+    month = partition_month(name)
+    staging = f"incidents_{name}"
+    cursor = connection.cursor(dictionary=True)
+
+    try:
+        # A staging table left by an interrupted run still holds its rows
+        if not table_exists(cursor, staging):
+            cursor.execute(f"CREATE TABLE {staging} LIKE incidents")
+            cursor.execute(f"ALTER TABLE {staging} REMOVE PARTITIONING")
+            # Atomic swap: the month's rows move to the staging table, where
+            # no later insert or update can reach them
+            cursor.execute(f"ALTER TABLE incidents EXCHANGE PARTITION {name} WITH TABLE {staging}")
+
+        cursor.execute(f"SELECT * FROM {staging}")
+        rows = cursor.fetchall()
+        for row in rows:
+            # Generated column, recomputed if the row is ever restored
+            row.pop("severity_rank", None)
+
+        if rows:
+            write_archive(month, rows)
+
+            cursor.executemany("""
+                INSERT IGNORE INTO incident_archive (incident_id, user_id, archive_month)
+                VALUES (%s, %s, %s)
+            """, [(row["id"], row["user_id"], month) for row in rows])
+            connection.commit()
+
+        # Only drop the partition if nothing was written to it since the swap;
+        # the lock keeps new rows out between the check and the drop
+        cursor.execute("LOCK TABLES incidents WRITE")
+        try:
+            cursor.execute(f"SELECT COUNT(*) AS count FROM incidents PARTITION ({name})")
+            arrived = cursor.fetchone()["count"]
+            if not arrived:
+                cursor.execute(f"ALTER TABLE incidents DROP PARTITION {name}")
+        finally:
+            cursor.execute("UNLOCK TABLES")
+
+        cursor.execute(f"DROP TABLE {staging}")
+
+        if arrived:
+            logger.warning(f"{arrived} incidents were written to {name} while archiving, left for the next run")
+        logger.info(f"Archived {len(rows)} incidents from {name} to {archive_path(month)}")
+        return len(rows)
+
+    except Error:
+        connection.rollback()
+        raise
+
+    finally:
+        cursor.close()
+
+def run_archival(dry_run: bool = False) -> Dict[str, int]:
+    """Add upcoming partitions and archive months past the retention window"""
+    connection = get_db_connection()
+    cursor = connection.cursor()
+
+    try:
+        if not is_partitioned(cursor):
+            raise RuntimeError("incidents is not partitioned, run 'python partitions.py setup' first")
+
+        ensure_future_partitions(cursor)
+
+        cutoff = add_months(month_start(date.today()), -settings.incident_retention_months)
+        partitions = list_partitions(cursor)
+        expired = [name for name in partitions if add_months(partition_month(name), 1) <= cutoff]
+
+        # DROP PARTITION can't remove the last monthly partition
+        if len(expired) == len(partitions):
+            expired = expired[:-1]
+
+        archived = {}
+        for name in expired:
+            if dry_run:
+                logger.info(f"Would archive {name}")
+                continue
+            archived[name] = archive_partition(connection, name)
+        return archived
+
+    finally:
+        cursor.close()
+        connection.close()
+
+def load_archived_incident(cursor, incident_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Look up an incident that has been moved to an archive file"""
+    cursor.execute("""
+        SELECT user_id, archive_month FROM incident_archive
+        WHERE incident_id = %s
+    """, (incident_id,))
+    entry = cursor.fetchone()
+
+    if not entry or (user_id is not None and entry["user_id"] != user_id):
+        return None
+
+    row = read_archive(entry["archive_month"]).get(incident_id)
+    if row is None:
+        return None
+
+    row = dict(row)
+    row["cluster_size"] = None
+    if row.get("cluster_id"):
+        cursor.execute("SELECT size FROM incident_clusters WHERE id = %s", (row["cluster_id"],))
+        cluster = cursor.fetchone()
+        row["cluster_size"] = cluster["size"] if cluster else None
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Incident partitioning and archival")
+    parser.add_argument("command", choices=["setup", "archive"])
+    parser.add_argument("--dry-run", action="store_true", help="only list partitions that would be archived")
+    args = parser.parse_args()
+
+    if args.command == "setup":
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        try:
+            partition_incidents(cursor)
+        finally:
+            cursor.close()
+            connection.close()
+    else:
+        archived = run_archival(args.dry_run)
+        print(f"Archived {sum(archived.values())} incidents from {len(archived)} partitions")
+
+if __name__ == "__main__":
+    main()
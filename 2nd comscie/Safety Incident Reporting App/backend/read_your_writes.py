@@ -0,0 +1,76 @@
+"""
+Read-your-writes across workers and hosts.
+
+After a write, database.record_write() marks the request; this middleware
+then hands the client the time of that write, both as a cookie (browsers
+send it back on their own) and as an X-Last-Write response header (for
+clients that don't keep cookies, which should echo it back as an
+X-Last-Write request header). On later requests the value is bound to
+database.client_pin, and reads stay on the primary until it is older than
+READ_YOUR_WRITES_WINDOW_SECONDS, whichever process serves them.
+
+Timestamps are wall-clock seconds, so the servers' clocks must be kept in
+sync (NTP); skew eats into the window.
+"""
+from http.cookies import SimpleCookie
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from config import get_settings
+from database import ClientPin, client_pin
+
+COOKIE_NAME = "last_write"
+HEADER_NAME = "x-last-write"
+
+def parse_last_write(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def last_write_from(scope) -> Optional[float]:
+    """Time of the client's last write, from the header or the cookie"""
+    cookie = None
+    for name, value in scope.get("headers", []):
+        if name == HEADER_NAME.encode():
+            return parse_last_write(value.decode("latin-1"))
+        if name == b"cookie":
+            cookie = value.decode("latin-1")
+
+    if cookie:
+        morsel = SimpleCookie(cookie).get(COOKIE_NAME)
+        if morsel:
+            return parse_last_write(morsel.value)
+    return None
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware carrying the read-your-writes pin with the client"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pin = ClientPin(last_write_from(scope))
+        token = client_pin.set(pin)
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and pin.wrote:
+                window = int(get_settings().read_your_writes_window_seconds) + 1
+                value = f"{pin.last_write:.3f}"
+                headers = MutableHeaders(scope=message)
+                headers.append(HEADER_NAME, value)
+                headers.append(
+                    "set-cookie",
+                    f"{COOKIE_NAME}={value}; Max-Age={window}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            client_pin.reset(token)
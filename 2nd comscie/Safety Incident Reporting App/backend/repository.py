@@ -0,0 +1,258 @@
+"""
+Repository layer: every query the API makes, on top of a storage backend.
+
+Routes, the write pipeline and the counter flusher go through a Repository
+instead of opening connections themselves, so the same code runs on MySQL
+and on embedded SQLite (see storage.py). Rows are returned as dicts with
+sensitive columns still encrypted; backend errors surface as StorageError.
+"""
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from clustering import assign_cluster
+from incident_writes import database_now, encrypt_incidents, incident_response, insert_incidents, submit_idempotent
+from storage import StorageError, get_storage
+from triage import fetch_triage_page, transition_status
+
+# Incident rows with the size of their duplicate cluster
+INCIDENT_SELECT = """
+    SELECT i.*, c.size AS cluster_size
+    FROM incidents i
+    LEFT JOIN incident_clusters c ON c.id = i.cluster_id
+"""
+
+COUNTER_FIELDS = ("likes_count", "comments_count")
+
+class Repository:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def _error(self, error: Exception) -> StorageError:
+        return StorageError(str(error), retryable=self.storage.is_retryable(error))
+
+    @contextmanager
+    def _reading(self, pin_key: Optional[str] = None, primary: bool = False):
+        """Dictionary cursor on a read connection"""
+        connection = None
+        cursor = None
+        try:
+            connection = self.storage.connect_read(pin_key, primary)
+            cursor = connection.cursor(dictionary=True)
+            yield cursor
+        except self.storage.Error as e:
+            raise self._error(e) from e
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
+    @contextmanager
+    def _writing(self, connection=None):
+        """Dictionary cursor in a transaction, committed if the block succeeds"""
+        owned = connection is None
+        cursor = None
+        try:
+            if owned:
+                connection = self.storage.connect()
+            cursor = connection.cursor(dictionary=True)
+            yield cursor
+            connection.commit()
+        except self.storage.Error as e:
+            if connection:
+                connection.rollback()
+            raise self._error(e) from e
+        except Exception:
+            if connection:
+                connection.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if owned and connection:
+                connection.close()
+
+    def connect(self):
+        """Write connection for callers that keep one open (the write pipeline)"""
+        try:
+            return self.storage.connect()
+        except self.storage.Error as e:
+            raise self._error(e) from e
+
+    def init_schema(self, force: bool = False):
+        self.storage.init_schema(force)
+
+    def record_write(self, pin_key: Optional[str]):
+        """Keep a user's reads on the primary after they write"""
+        self.storage.record_write(pin_key)
+
+    def status(self) -> List[dict]:
+        return self.storage.status()
+
+    # Users
+
+    def get_user_by_username(self, username: str, pin_key: Optional[str] = None,
+                             primary: bool = False) -> Optional[Dict[str, Any]]:
+        with self._reading(pin_key, primary) as cursor:
+            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+            return cursor.fetchone()
+
+    def create_user(self, email: str, username: str, full_name: str,
+                    hashed_password: str) -> Optional[Dict[str, Any]]:
+        """Insert a user; None if the email or username is taken"""
+        with self._writing() as cursor:
+            cursor.execute("SELECT id FROM users WHERE email = %s OR username = %s", (email, username))
+            if cursor.fetchone():
+                return None
+
+            cursor.execute("""
+                INSERT INTO users (email, username, full_name, hashed_password)
+                VALUES (%s, %s, %s, %s)
+            """, (email, username, full_name, hashed_password))
+
+            cursor.execute("SELECT * FROM users WHERE id = %s", (cursor.lastrowid,))
+            return cursor.fetchone()
+
+    # Incidents
+
+    def create_incidents(self, connection, items: Sequence[Tuple[int, Any]]) -> List[Dict[str, Any]]:
+        """
+        Encrypt, insert and cluster (user_id, incident) pairs in one
+        transaction on the caller's connection, and build their responses
+        from the plaintext
+        """
+        encrypted = encrypt_incidents([incident for _, incident in items])
+
+        with self._writing(connection) as cursor:
+            created_at = database_now(cursor)
+            incident_ids = insert_incidents(
+                cursor,
+                [user_id for user_id, _ in items],
+                [incident for _, incident in items],
+                encrypted,
+                created_at,
+            )
+
+            responses = []
+            for (_, incident), incident_id in zip(items, incident_ids):
+                cluster_id, cluster_size = assign_cluster(
+                    cursor, incident_id, incident.location_lat, incident.location_lng, incident.incident_date
+                )
+                responses.append(incident_response(incident_id, incident, created_at, cluster_id, cluster_size))
+
+        return responses
+
+    def submit_batch(self, user_id: int, items: Sequence[Any], encrypted: Sequence[tuple],
+                     attempts: int = 3) -> Dict[str, Dict[str, Any]]:
+        """Idempotent batch insert (see incident_writes.submit_idempotent)"""
+        for attempt in range(attempts):
+            try:
+                with self._writing() as cursor:
+                    return submit_idempotent(cursor, user_id, items, encrypted)
+            except StorageError as e:
+                # Two replays of the same keys can deadlock; the retry sees the winner's rows
+                if e.retryable and attempt < attempts - 1:
+                    continue
+                raise
+
+    def list_incidents(self, user_id: int, pin_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._reading(pin_key) as cursor:
+            cursor.execute(f"""
+                {INCIDENT_SELECT}
+                WHERE i.user_id = %s
+                ORDER BY i.created_at DESC
+            """, (user_id,))
+            return cursor.fetchall()
+
+    def get_incident(self, incident_id: int, user_id: int,
+                     pin_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._reading(pin_key) as cursor:
+            cursor.execute(f"""
+                {INCIDENT_SELECT}
+                WHERE i.id = %s AND i.user_id = %s
+            """, (incident_id, user_id))
+            incident = cursor.fetchone()
+
+            if not incident:
+                # Older incidents may have been moved to archive files
+                incident = self.storage.load_archived_incident(cursor, incident_id, user_id)
+
+            return incident
+
+    def triage_page(self, status: str, pin_key: Optional[str] = None,
+                    **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of the moderator queue (see triage.fetch_triage_page)"""
+        with self._reading(pin_key) as cursor:
+            return fetch_triage_page(cursor, status, **filters)
+
+    def transition_status(self, incident_ids: List[int], new_status: str) -> Dict[str, List[int]]:
+        # One transaction for the whole batch
+        with self._writing() as cursor:
+            return transition_status(cursor, incident_ids, new_status)
+
+    def get_cluster(self, cluster_id: int, pin_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """A duplicate cluster with the ids of its incidents"""
+        with self._reading(pin_key) as cursor:
+            cursor.execute("SELECT * FROM incident_clusters WHERE id = %s", (cluster_id,))
+            cluster = cursor.fetchone()
+            if not cluster:
+                return None
+
+            cursor.execute("SELECT id FROM incidents WHERE cluster_id = %s ORDER BY id", (cluster_id,))
+            cluster['incident_ids'] = [row['id'] for row in cursor.fetchall()]
+            return cluster
+
+    # Community posts
+
+    def get_post_counts(self, post_id: int, pin_key: Optional[str] = None,
+                        primary: bool = False) -> Optional[Dict[str, Any]]:
+        """Stored like/comment counters of a post"""
+        with self._reading(pin_key, primary) as cursor:
+            cursor.execute("""
+                SELECT id, likes_count, comments_count FROM community_posts
+                WHERE id = %s
+            """, (post_id,))
+            return cursor.fetchone()
+
+    def add_like(self, post_id: int, user_id: int) -> bool:
+        """Record a user's like; False if they already liked the post"""
+        with self._writing() as cursor:
+            cursor.execute("""
+                INSERT IGNORE INTO post_likes (post_id, user_id) VALUES (%s, %s)
+            """, (post_id, user_id))
+            return cursor.rowcount == 1
+
+    def remove_like(self, post_id: int, user_id: int) -> bool:
+        """Remove a user's like; False if they hadn't liked the post"""
+        with self._writing() as cursor:
+            cursor.execute("DELETE FROM post_likes WHERE post_id = %s AND user_id = %s", (post_id, user_id))
+            return cursor.rowcount == 1
+
+    def add_post_counts(self, deltas: Dict[int, Dict[str, int]]):
+        """Apply counter deltas to many posts with one UPDATE"""
+        # Ascending id order so concurrent flushers lock rows in the same order
+        post_ids = sorted(deltas)
+
+        set_clauses = []
+        params = []
+        for field in COUNTER_FIELDS:
+            cases = " ".join("WHEN %s THEN %s" for _ in post_ids)
+            set_clauses.append(f"{field} = {field} + CASE id {cases} ELSE 0 END")
+            for post_id in post_ids:
+                params.extend((post_id, deltas[post_id].get(field, 0)))
+
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        params.extend(post_ids)
+
+        with self._writing() as cursor:
+            cursor.execute(f"""
+                UPDATE community_posts
+                SET {", ".join(set_clauses)}
+                WHERE id IN ({placeholders})
+            """, params)
+
+@lru_cache()
+def get_repository() -> Repository:
+    """Repository on the configured storage backend"""
+    return Repository(get_storage())
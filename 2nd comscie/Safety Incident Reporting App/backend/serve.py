@@ -0,0 +1,125 @@
+"""
+Production server entry point
+
+Runs the FastAPI app under gunicorn with uvicorn workers:
+
+- one worker per available CPU core by default (WORKERS in .env)
+- the app is preloaded in the master, so imports, the encryption key
+  derivation and the schema check happen once and are shared with every
+  forked worker (workers never run DDL concurrently)
+- workers are recycled after WORKER_MAX_REQUESTS requests and can be capped
+  in memory and open files (see config.Settings)
+- admission control (rate limits, ADMISSION_MAX_IN_FLIGHT) is per worker,
+  so its limits add up across the workers
+
+Signals (sent to the master, pid in PID_FILE if set):
+
+- HUP   restart workers gracefully with the new configuration
+- TERM  drain: stop accepting, finish in-flight requests for up to
+        WORKER_GRACEFUL_TIMEOUT_SECONDS, then exit
+- USR2  start a new master with new code next to the old one
+        (then send TERM to the old master); needed for code upgrades because
+        HUP re-forks from the preloaded app
+- TTIN / TTOU  add / remove one worker
+
+    python serve.py
+    python serve.py --workers 4
+
+On Windows (no fork) it falls back to a single uvicorn process.
+"""
+import argparse
+import logging
+import os
+import sys
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+def default_workers() -> int:
+    """Worker count sized to the CPU cores this process may run on"""
+    if settings.workers > 0:
+        return settings.workers
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def apply_worker_limits(server, worker):
+    """gunicorn post_fork hook: per-worker resource limits"""
+    import resource
+
+    if settings.worker_max_memory_mb > 0:
+        limit = settings.worker_max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    if settings.worker_max_open_files > 0:
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        soft = settings.worker_max_open_files
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+def gunicorn_options(workers: int, host: str, port: int) -> dict:
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": settings.worker_timeout_seconds,
+        "graceful_timeout": settings.worker_graceful_timeout_seconds,
+        "keepalive": settings.worker_keepalive_seconds,
+        "max_requests": settings.worker_max_requests,
+        "max_requests_jitter": settings.worker_max_requests_jitter,
+        "post_fork": apply_worker_limits,
+        "accesslog": "-",
+    }
+    if settings.pid_file:
+        options["pidfile"] = settings.pid_file
+    return options
+
+def run(workers: int, host: str, port: int):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Runs once in the master because of preload_app
+            from main import app, repository
+            from encryption import get_cipher
+            # Derive the key here so forked workers inherit it
+            get_cipher()
+            # Create/migrate the schema once, then keep the workers' startup
+            # hooks from racing each other through the same DDL
+            if settings.init_db_on_startup:
+                repository.init_schema()
+                settings.init_db_on_startup = False
+            return app
+
+    Server(gunicorn_options(workers, host, port)).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked workers")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        import uvicorn
+        logger.warning("Pre-forked workers need fork(); running a single uvicorn process")
+        uvicorn.run("main:app", host=args.host, port=args.port)
+        return
+
+    run(args.workers, args.host, args.port)
+
+if __name__ == "__main__":
+    main()
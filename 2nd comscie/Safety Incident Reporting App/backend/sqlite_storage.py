@@ -0,0 +1,373 @@
+"""
+Embedded SQLite storage backend (STORAGE_BACKEND=sqlite).
+
+Everything lives in one database file (SQLITE_PATH) in WAL mode: readers
+never block the writer or each other, and a commit is an append to the
+write-ahead log instead of a rewrite of the database pages. With
+synchronous=NORMAL the log is fsynced at checkpoints rather than on every
+commit, which can lose the last transactions on power loss (never on an
+application crash) but keeps the database consistent; set
+SQLITE_SYNCHRONOUS=FULL for durability of every commit.
+
+The connections mimic the mysql.connector surface the query helpers use,
+so clustering.py, triage.py and incident_writes.py run unchanged:
+
+- %s placeholders, dictionary cursors, lastrowid of the first row of a
+  multi-row INSERT
+- NOW(), LEAST() and GREATEST() as SQL functions, INSERT IGNORE as INSERT OR
+  IGNORE
+- write transactions start with BEGIN IMMEDIATE, which takes the database
+  write lock up front, so SELECT ... FOR UPDATE is dropped: writers are
+  already serialized, more strictly than by row locks
+- datetimes are stored as 'YYYY-MM-DD HH:MM:SS[.ffffff]' text (local time,
+  tzinfo dropped like mysql.connector does), which sorts chronologically
+
+One writer at a time is SQLite's model; concurrent writers wait up to
+SQLITE_BUSY_TIMEOUT_MS for the lock. Partitioning/archival (partitions.py)
+and read replicas are MySQL features and don't apply here.
+"""
+import logging
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from config import get_settings
+from database import SCHEMA_VERSION, SEVERITY_RANK_SQL, TRIAGE_INDEXES
+
+logger = logging.getLogger(__name__)
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.replace(tzinfo=None).isoformat(" ")
+
+def _convert_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_datetime)
+
+# MySQL-only syntax in the shared query helpers and its SQLite equivalent
+_REWRITES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bINSERT IGNORE\b"), "INSERT OR IGNORE"),
+    (re.compile(r"\bFOR UPDATE\b"), ""),
+    (re.compile(r"@@auto_increment_increment"), "1"),
+]
+
+@lru_cache(maxsize=512)
+def translate(sql: str) -> str:
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+def _now() -> str:
+    # Second precision, like MySQL's NOW()
+    return datetime.now().replace(microsecond=0).isoformat(" ")
+
+class SQLiteCursor:
+    def __init__(self, connection: "SQLiteConnection", dictionary: bool):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self.dictionary = dictionary
+        self.lastrowid: Optional[int] = None
+        self.rowcount = -1
+
+    def execute(self, sql: str, params=()):
+        self._connection.begin()
+        self._cursor.execute(translate(sql), tuple(params or ()))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        # SQLite reports the last row of a multi-row INSERT, MySQL the first;
+        # the ids of one INSERT are consecutive since it holds the write lock
+        if self.rowcount > 1 and self.lastrowid and sql.lstrip()[:6].upper() == "INSERT":
+            self.lastrowid -= self.rowcount - 1
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self._connection.begin()
+        self._cursor.executemany(translate(sql), [tuple(params) for params in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+        return self
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self) -> List:
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteConnection:
+    """
+    Autocommit connection; a write connection opens BEGIN IMMEDIATE before
+    its first statement after a commit or rollback
+    """
+
+    def __init__(self, path: str, write: bool, busy_timeout_ms: int, synchronous: str):
+        self.write = write
+        # Kept open by SQLiteStorage for reuse; close() only ends the transaction
+        self.pooled = False
+        self.raw = sqlite3.connect(
+            path,
+            timeout=busy_timeout_ms / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self.raw.execute("PRAGMA foreign_keys = ON")
+        self.raw.execute(f"PRAGMA synchronous = {synchronous}")
+        self.raw.create_function("NOW", 0, _now)
+        self.raw.create_function("LEAST", -1, min, deterministic=True)
+        self.raw.create_function("GREATEST", -1, max, deterministic=True)
+
+    def begin(self):
+        if self.write and not self.raw.in_transaction:
+            self.raw.execute("BEGIN IMMEDIATE")
+
+    def cursor(self, dictionary: bool = False) -> SQLiteCursor:
+        return SQLiteCursor(self, dictionary)
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def is_connected(self) -> bool:
+        try:
+            self.raw.execute("SELECT 1")
+            return True
+        except sqlite3.ProgrammingError:
+            return False
+
+    def close(self):
+        if self.pooled:
+            self.rollback()
+            return
+        self.raw.close()
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        hashed_password VARCHAR(255) NOT NULL,
+        role VARCHAR(50) DEFAULT 'user',
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS incidents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        title VARCHAR(255) NOT NULL,
+        description_encrypted TEXT NOT NULL,
+        incident_type VARCHAR(100) NOT NULL,
+        severity VARCHAR(50) NOT NULL,
+        location_lat REAL,
+        location_lng REAL,
+        location_address_encrypted TEXT,
+        incident_date DATETIME NOT NULL,
+        status VARCHAR(50) DEFAULT 'reported',
+        severity_rank INTEGER GENERATED ALWAYS AS ({SEVERITY_RANK_SQL}) STORED,
+        cluster_id INTEGER,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_incidents_user_id ON incidents (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_incident_date ON incidents (incident_date)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_cluster_id ON incidents (cluster_id)",
+    *[f"CREATE INDEX IF NOT EXISTS {name} ON incidents ({columns})" for name, columns in TRIAGE_INDEXES],
+    """
+    CREATE TABLE IF NOT EXISTS incident_clusters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        center_lat REAL NOT NULL,
+        center_lng REAL NOT NULL,
+        first_incident_date DATETIME NOT NULL,
+        last_incident_date DATETIME NOT NULL,
+        size INTEGER NOT NULL DEFAULT 1,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS incident_submissions (
+        user_id INTEGER NOT NULL,
+        client_key VARCHAR(64) NOT NULL,
+        incident_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (user_id, client_key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS incident_cluster_cells (
+        cell_lat INTEGER NOT NULL,
+        cell_lng INTEGER NOT NULL,
+        time_bucket INTEGER NOT NULL,
+        cluster_id INTEGER NOT NULL REFERENCES incident_clusters(id) ON DELETE CASCADE,
+        PRIMARY KEY (cell_lat, cell_lng, time_bucket, cluster_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS evidence (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        incident_id INTEGER NOT NULL REFERENCES incidents(id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        file_name_encrypted VARCHAR(500) NOT NULL,
+        file_type VARCHAR(100) NOT NULL,
+        file_path_encrypted TEXT NOT NULL,
+        file_size INTEGER,
+        notes_encrypted TEXT,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_evidence_incident_id ON evidence (incident_id)",
+    "CREATE INDEX IF NOT EXISTS idx_evidence_user_id ON evidence (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS safety_zones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL,
+        location_lat REAL NOT NULL,
+        location_lng REAL NOT NULL,
+        zone_type VARCHAR(50) NOT NULL,
+        radius_meters INTEGER DEFAULT 100,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_safety_zones_zone_type ON safety_zones (zone_type)",
+    """
+    CREATE TABLE IF NOT EXISTS community_posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        title VARCHAR(255) NOT NULL,
+        content_encrypted TEXT NOT NULL,
+        post_type VARCHAR(100) DEFAULT 'general',
+        is_anonymous BOOLEAN DEFAULT 0,
+        likes_count INTEGER DEFAULT 0,
+        comments_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_community_posts_user_id ON community_posts (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_community_posts_post_type ON community_posts (post_type)",
+    """
+    CREATE TABLE IF NOT EXISTS post_likes (
+        post_id INTEGER NOT NULL REFERENCES community_posts(id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (post_id, user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_post_likes_user_id ON post_likes (user_id)",
+]
+
+# SQLite has no ON UPDATE CURRENT_TIMESTAMP
+UPDATED_AT_TABLES = ("users", "incidents", "incident_clusters", "safety_zones", "community_posts")
+
+class SQLiteStorage:
+    name = "sqlite"
+    Error = sqlite3.Error
+
+    def __init__(self, path: str, busy_timeout_ms: Optional[int] = None, synchronous: Optional[str] = None):
+        settings = get_settings()
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else settings.sqlite_busy_timeout_ms
+        self.synchronous = (synchronous or settings.sqlite_synchronous).upper()
+        if self.synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid SQLITE_SYNCHRONOUS {self.synchronous!r}")
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def _connect(self, write: bool) -> SQLiteConnection:
+        return SQLiteConnection(self.path, write, self.busy_timeout_ms, self.synchronous)
+
+    def connect(self) -> SQLiteConnection:
+        """A new write connection (callers may keep it, like the write pipeline)"""
+        return self._connect(write=True)
+
+    def connect_read(self, pin_key: Optional[str] = None, primary: bool = False) -> SQLiteConnection:
+        # Opening a connection costs ~30x a point query, so each thread
+        # keeps its read connection open. One database file: every read
+        # sees every committed write
+        connection = getattr(self._local, "reader", None)
+        if connection is None:
+            connection = self._local.reader = self._connect(write=False)
+            connection.pooled = True
+        return connection
+
+    def record_write(self, pin_key: Optional[str]):
+        pass
+
+    def init_schema(self, force: bool = False):
+        """Create the tables (skipped if PRAGMA user_version is current)"""
+        connection = self._connect(write=False)
+        raw = connection.raw
+        try:
+            # Persistent: stored in the database file
+            raw.execute("PRAGMA journal_mode = WAL")
+
+            current_version = raw.execute("PRAGMA user_version").fetchone()[0]
+            if current_version >= SCHEMA_VERSION and not force:
+                logger.info(f"Database schema is current (version {current_version})")
+                return
+
+            raw.execute("BEGIN IMMEDIATE")
+            # CREATE INDEX IF NOT EXISTS keeps an older definition
+            for name, columns in TRIAGE_INDEXES:
+                existing = [row[2] for row in raw.execute(f"PRAGMA index_info({name})")]
+                if existing and existing != [column.strip() for column in columns.split(",")]:
+                    raw.execute(f"DROP INDEX {name}")
+            for statement in SCHEMA:
+                raw.execute(statement)
+            for table in UPDATED_AT_TABLES:
+                raw.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_updated_at
+                    AFTER UPDATE ON {table} FOR EACH ROW
+                    WHEN NEW.updated_at IS OLD.updated_at
+                    BEGIN
+                        UPDATE {table} SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+                    END
+                """)
+            raw.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            raw.execute("COMMIT")
+            logger.info(f"SQLite database initialized at {self.path}")
+
+        except sqlite3.Error as e:
+            logger.error(f"Error initializing database: {e}")
+            connection.rollback()
+            raise
+
+        finally:
+            connection.close()
+
+    def is_retryable(self, error: Exception) -> bool:
+        # SQLITE_BUSY after the busy timeout ran out
+        return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+    def load_archived_incident(self, cursor, incident_id: int, user_id: int):
+        return None
+
+    def status(self) -> List[dict]:
+        return []
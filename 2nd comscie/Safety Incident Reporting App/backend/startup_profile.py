@@ -0,0 +1,145 @@
+"""
+Startup profiling: time per phase of a cold start
+
+Starts a fresh interpreter (like a new worker or test process), runs the
+same steps the app does before it can serve its first request and reports
+the time spent in each:
+
+- interpreter   python itself, up to the first line of this script
+- config        pydantic-settings and reading .env
+- encryption    importing encryption.py (no key derivation)
+- database      importing database.py and the storage/repository layer
+- auth          importing auth.py
+- app           importing main.py (FastAPI, routes and everything else)
+- key           deriving the encryption key (PBKDF2, or the key cache)
+- init_schema   schema check / DDL on STORAGE_BACKEND, only with --with-db
+
+Exits non-zero if the total exceeds the budget (STARTUP_BUDGET_SECONDS,
+or --budget), so it can guard cold-start time in CI.
+
+    python startup_profile.py
+    python startup_profile.py --with-db --budget 1.5
+    python startup_profile.py --modules 15     # slowest imports as well
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+def run_phases(with_db: bool) -> list:
+    """Runs in the child process"""
+    phases = []
+    last = time.perf_counter()
+
+    def phase(name: str):
+        nonlocal last
+        now = time.perf_counter()
+        phases.append((name, now - last))
+        last = now
+
+    from config import get_settings
+    get_settings()
+    phase("config")
+
+    import encryption
+    phase("encryption")
+
+    import repository
+    phase("database")
+
+    import auth  # noqa: F401
+    phase("auth")
+
+    import main  # noqa: F401
+    phase("app")
+
+    encryption.get_cipher()
+    phase("key")
+
+    if with_db:
+        repository.get_repository().init_schema()
+        phase("init_schema")
+
+    return phases
+
+def slowest_imports(stderr: str, count: int) -> list:
+    """Parse -X importtime output into (module, self seconds), slowest first"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1_000_000))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return modules[:count]
+
+def profile(with_db: bool, modules: int) -> dict:
+    command = [sys.executable]
+    if modules:
+        command += ["-X", "importtime"]
+    command += [str(Path(__file__).resolve()), "--child"]
+    if with_db:
+        command.append("--with-db")
+
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    total = time.perf_counter() - start
+
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Startup failed with exit code {result.returncode}")
+
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    # Whatever the child didn't account for: interpreter start and exit
+    phases.insert(0, ["interpreter", total - sum(seconds for _, seconds in phases)])
+
+    return {
+        "total_seconds": total,
+        "phases": phases,
+        "slowest_imports": slowest_imports(result.stderr, modules) if modules else [],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--with-db", action="store_true", help="include the schema check (needs the database)")
+    parser.add_argument("--budget", type=float, help="seconds (default: STARTUP_BUDGET_SECONDS)")
+    parser.add_argument("--modules", type=int, default=0, help="also list the N slowest imports")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_phases(args.with_db)))
+        return
+
+    report = profile(args.with_db, args.modules)
+
+    budget = args.budget
+    if budget is None:
+        sys.path.insert(0, str(BACKEND_DIR))
+        from config import get_settings
+        budget = get_settings().startup_budget_seconds
+    report["budget_seconds"] = budget
+    report["within_budget"] = report["total_seconds"] <= budget
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, seconds in report["phases"]:
+            print(f"{name:<14} {seconds * 1000:>9.1f} ms")
+        print(f"{'total':<14} {report['total_seconds'] * 1000:>9.1f} ms   (budget {budget * 1000:.0f} ms)")
+        if report["slowest_imports"]:
+            print("\nslowest imports (self time):")
+            for name, seconds in report["slowest_imports"]:
+                print(f"  {seconds * 1000:>8.1f} ms  {name}")
+
+    if not report["within_budget"]:
+        print(f"Cold start took {report['total_seconds']:.2f}s, over the {budget:.2f}s budget", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Storage backends behind the repository layer (repository.py).
+
+A backend hands out DB-API connections with the mysql.connector surface the
+query helpers are written against (dictionary cursors, %s placeholders,
+lastrowid), creates the schema and knows which of its errors are worth a
+retry. STORAGE_BACKEND picks one:
+
+- mysql   the primary plus read replicas from database.py (default)
+- sqlite  one embedded database file in WAL mode (sqlite_storage.py), for
+          single-node / edge deployments and tests; no network, no server
+"""
+from functools import lru_cache
+from typing import List, Optional
+
+from mysql.connector import Error, errorcode
+
+from config import get_settings
+from database import (
+    get_db_connection,
+    get_read_connection,
+    get_replica_status,
+    init_database,
+    record_write,
+)
+
+STORAGE_BACKENDS = ("mysql", "sqlite")
+
+# Transient InnoDB errors worth retrying the whole transaction for
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+class StorageError(Exception):
+    """A backend error, surfaced by the repository regardless of backend"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class MySQLStorage:
+    name = "mysql"
+    Error = Error
+
+    def connect(self):
+        """Connection to the primary, for writes"""
+        return get_db_connection()
+
+    def connect_read(self, pin_key: Optional[str] = None, primary: bool = False):
+        """Connection for reads: a healthy replica unless pinned to the primary"""
+        if primary:
+            return get_db_connection()
+        return get_read_connection(pin_key)
+
+    def record_write(self, pin_key: Optional[str]):
+        record_write(pin_key)
+
+    def init_schema(self, force: bool = False):
+        init_database(force)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return getattr(error, "errno", None) in RETRYABLE_ERRORS
+
+    def load_archived_incident(self, cursor, incident_id: int, user_id: int):
+        # Deferred: only needed for the rare miss on the hot table
+        from partitions import load_archived_incident
+        return load_archived_incident(cursor, incident_id, user_id)
+
+    def status(self) -> List[dict]:
+        return get_replica_status()
+
+@lru_cache()
+def get_storage():
+    """The configured backend, created on first use"""
+    settings = get_settings()
+
+    if settings.storage_backend == "mysql":
+        return MySQLStorage()
+
+    if settings.storage_backend == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(settings.sqlite_path)
+
+    raise ValueError(
+        f"Unknown STORAGE_BACKEND {settings.storage_backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}"
+    )
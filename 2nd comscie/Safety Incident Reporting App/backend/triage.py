@@ -0,0 +1,157 @@
+"""
+Moderator triage queue over incidents from all users.
+
+Pages are ordered by severity (most severe first), then age (oldest first),
+then id, and use keyset pagination: the cursor holds the sort key of the
+last row returned, so fetching page N costs the same as page 1.
+
+The page query runs in two steps. The inner query filters and orders on
+columns that are all in one of the idx_triage_* indexes (see database.py),
+so it never touches table rows; the outer query then joins back on the
+primary key for just the rows of the page.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+SEVERITY_RANKS = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+INCIDENT_STATUSES = ("reported", "acknowledged", "in_progress", "resolved", "dismissed")
+
+# Allowed moves for the bulk status transition
+STATUS_TRANSITIONS = {
+    "reported": {"acknowledged", "in_progress", "resolved", "dismissed"},
+    "acknowledged": {"in_progress", "resolved", "dismissed"},
+    "in_progress": {"acknowledged", "resolved", "dismissed"},
+    "resolved": {"in_progress"},
+    "dismissed": {"reported"},
+}
+
+TRIAGE_ROLES = ("moderator", "responder", "admin")
+
+MAX_PAGE_SIZE = 200
+MAX_BULK_TRANSITION = 500
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor for the row a page ended on"""
+    key = [row["severity_rank"], row["created_at"].isoformat(), row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[int, datetime, int]:
+    try:
+        rank, created_at, incident_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), datetime.fromisoformat(created_at), int(incident_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def fetch_triage_page(
+    db_cursor,
+    status: str,
+    severities: Optional[List[str]] = None,
+    incident_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    after: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of the triage queue and the cursor for the next page"""
+    conditions = ["status = %s"]
+    params: List[Any] = [status]
+
+    if severities:
+        unknown = [s for s in severities if s not in SEVERITY_RANKS]
+        if unknown:
+            raise ValueError(f"Unknown severity: {', '.join(unknown)}")
+        ranks = sorted({SEVERITY_RANKS[s] for s in severities})
+        conditions.append(f"severity_rank IN ({', '.join(['%s'] * len(ranks))})")
+        params.extend(ranks)
+
+    if incident_type:
+        conditions.append("incident_type = %s")
+        params.append(incident_type)
+
+    if date_from:
+        conditions.append("incident_date >= %s")
+        params.append(date_from)
+
+    if date_to:
+        conditions.append("incident_date < %s")
+        params.append(date_to)
+
+    if after:
+        rank, created_at, incident_id = decode_cursor(after)
+        # Expanded form of (severity_rank, created_at, id) > (...) so MySQL
+        # can turn it into an index range
+        conditions.append("""
+            (severity_rank > %s
+             OR (severity_rank = %s AND (created_at > %s
+                                         OR (created_at = %s AND id > %s))))
+        """)
+        params.extend([rank, rank, created_at, created_at, incident_id])
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Fetch one extra row to know whether there is a next page
+    params.append(limit + 1)
+
+    db_cursor.execute(f"""
+        SELECT i.*, c.size AS cluster_size
+        FROM incidents i
+        LEFT JOIN incident_clusters c ON c.id = i.cluster_id
+        JOIN (
+            SELECT id FROM incidents
+            WHERE {" AND ".join(conditions)}
+            ORDER BY severity_rank, created_at, id
+            LIMIT %s
+        ) page ON page.id = i.id
+        ORDER BY i.severity_rank, i.created_at, i.id
+    """, params)
+
+    rows = db_cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+
+    return rows, next_cursor
+
+def transition_status(db_cursor, incident_ids: List[int], new_status: str) -> Dict[str, List[int]]:
+    """
+    Move incidents to a new status in the caller's transaction.
+
+    Rows are locked first so concurrent transitions serialize; incidents that
+    don't exist or can't make the move are reported and left unchanged.
+    """
+    if new_status not in INCIDENT_STATUSES:
+        raise ValueError(f"Unknown status: {new_status}")
+
+    incident_ids = sorted(set(incident_ids))
+    placeholders = ", ".join(["%s"] * len(incident_ids))
+
+    db_cursor.execute(f"""
+        SELECT id, status FROM incidents
+        WHERE id IN ({placeholders})
+        FOR UPDATE
+    """, incident_ids)
+    current = {row["id"]: row["status"] for row in db_cursor.fetchall()}
+
+    result = {"updated": [], "unchanged": [], "invalid_transition": [], "not_found": []}
+    for incident_id in incident_ids:
+        status = current.get(incident_id)
+        if status is None:
+            result["not_found"].append(incident_id)
+        elif status == new_status:
+            result["unchanged"].append(incident_id)
+        elif new_status in STATUS_TRANSITIONS.get(status, INCIDENT_STATUSES):
+            result["updated"].append(incident_id)
+        else:
+            result["invalid_transition"].append(incident_id)
+
+    if result["updated"]:
+        placeholders = ", ".join(["%s"] * len(result["updated"]))
+        db_cursor.execute(f"""
+            UPDATE incidents SET status = %s
+            WHERE id IN ({placeholders})
+        """, [new_status, *result["updated"]])
+
+    return result
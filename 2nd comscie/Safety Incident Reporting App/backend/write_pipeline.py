@@ -0,0 +1,200 @@
+"""
+Group-commit pipeline for incident inserts.
+
+Concurrent POST /incidents requests put their incident on a queue. Writer
+tasks take everything that is queued (up to WRITE_PIPELINE_MAX_BATCH), encrypt it,
+insert it with one multi-row INSERT, cluster it and commit once, so a surge
+costs one fsync per batch instead of one per incident. While a batch
+commits, new arrivals pile up for the next one; at low load a batch is a
+single incident and no latency is added. WRITE_PIPELINE_MAX_DELAY_MS
+optionally holds a batch open a little longer to let it fill.
+
+Responses are built from the request's plaintext and the generated ids,
+so nothing is read back or decrypted after the commit.
+
+Concurrent writers clustering nearby incidents can deadlock on the cluster
+grid's gap locks; InnoDB then rolls one transaction back, and its batch is
+retried (up to WRITE_PIPELINE_ATTEMPTS times) before anything fails.
+"""
+import asyncio
+import logging
+import time
+from collections import deque, defaultdict
+from typing import Any, Dict, List, Optional
+
+from config import get_settings
+from repository import get_repository
+from storage import StorageError
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Window for the commits/sec and incidents/sec rates
+RATE_WINDOW_SECONDS = 60
+
+# Base pause before retrying a deadlocked batch, grows with each attempt
+RETRY_BACKOFF_SECONDS = 0.01
+
+class _Writer:
+    """Holds one database connection, used from one executor thread at a time"""
+
+    def __init__(self):
+        self.repository = get_repository()
+        self.connection = None
+
+    def get_connection(self):
+        if self.connection is None or not self.connection.is_connected():
+            self.connection = self.repository.connect()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None and self.connection.is_connected():
+            self.connection.close()
+        self.connection = None
+
+    def write(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """Insert (user_id, incident) pairs in one transaction"""
+        return self.repository.create_incidents(self.get_connection(), items)
+
+class WritePipeline:
+    def __init__(self, max_batch: int, max_delay_ms: float, writers: int, attempts: int = 3):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.writers = writers
+        self.attempts = max(attempts, 1)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.commits = 0
+        self.incidents = 0
+        self.failed_batches = 0
+        self.retries = 0
+        self.batch_sizes: Dict[int, int] = defaultdict(int)
+        self._recent = deque()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._run(_Writer())) for _ in range(self.writers)]
+
+    async def stop(self):
+        """Finish what is queued, then stop the writers"""
+        if not self._tasks:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: int, incident: Any) -> Dict[str, Any]:
+        """Queue an incident and wait until its batch has committed"""
+        if not self._tasks:
+            raise RuntimeError("Write pipeline is not started")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((user_id, incident, future))
+        return await future
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self, writer: _Writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = await self._next_batch()
+                try:
+                    await self._write(loop, writer, batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            writer.close()
+
+    async def _write(self, loop, writer: _Writer, batch: List[tuple]):
+        items = [(user_id, incident) for user_id, incident, _ in batch]
+
+        for attempt in range(self.attempts):
+            try:
+                responses = await loop.run_in_executor(None, writer.write, items)
+                self._record_commit(len(batch))
+                for (_, _, future), response in zip(batch, responses):
+                    if not future.done():
+                        future.set_result(response)
+                return
+
+            except StorageError as e:
+                error = e
+                # Rolled back as a deadlock victim; nothing was written, so replay it
+                if e.retryable and attempt < self.attempts - 1:
+                    self.retries += 1
+                    logger.info(f"Batch of {len(batch)} incidents hit a lock conflict, retrying: {e}")
+                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * (attempt + 1))
+                    continue
+
+            except Exception as e:
+                error = e
+
+            break
+
+        self.failed_batches += 1
+        if len(batch) == 1:
+            if not batch[0][2].done():
+                batch[0][2].set_exception(error)
+            return
+        logger.warning(f"Batch of {len(batch)} incidents failed, retrying one by one: {error}")
+
+        # Isolate the bad item so it doesn't fail its batch neighbours
+        for entry in batch:
+            await self._write(loop, writer, [entry])
+
+    def _record_commit(self, size: int):
+        now = time.monotonic()
+        self.commits += 1
+        self.incidents += size
+        self.batch_sizes[size] += 1
+        self._recent.append((now, size))
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        recent = [size for at, size in self._recent if at >= now - RATE_WINDOW_SECONDS]
+        return {
+            "commits_total": self.commits,
+            "incidents_total": self.incidents,
+            "failed_batches_total": self.failed_batches,
+            "retries_total": self.retries,
+            "average_batch_size": self.incidents / self.commits if self.commits else 0,
+            "commits_per_second": len(recent) / RATE_WINDOW_SECONDS,
+            "incidents_per_second": sum(recent) / RATE_WINDOW_SECONDS,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+        }
+
+write_pipeline = WritePipeline(
+    settings.write_pipeline_max_batch,
+    settings.write_pipeline_max_delay_ms,
+    settings.write_pipeline_writers,
+    settings.write_pipeline_attempts,
+)